@@ -13,7 +13,7 @@
     "author": "Almus Dev",
     "website": "https://www.almus.dev",
     "category": "Technical",
-    "version": "17.0.1.0.0",
+    "version": "17.0.1.1.0",
     "depends": ["base"],
     "installable": True,
     "auto_install": False,
@@ -1 +1,3 @@
-from . import res_config_settings
\ No newline at end of file
+from . import res_config_settings
+from . import currency_rate_matrix
+from . import res_currency_rate
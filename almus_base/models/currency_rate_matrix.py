@@ -0,0 +1,100 @@
+from psycopg2.extras import execute_values
+
+from odoo import api, fields, models
+
+# Clave de la matriz de tasas en cr.precommit.data (se descarta al terminar la transacción)
+RATE_MATRIX_KEY = 'almus_base.currency_rate_matrix'
+
+
+class AlmusCurrencyRateMatrix(models.AbstractModel):
+    """Currency rates shared by the Almus modules during a transaction.
+
+    Rates are loaded in bulk, one query for every missing
+    (currency, company, date) triple, and kept in ``cr.precommit.data``: they
+    live as long as the transaction, are never shared between databases or
+    requests, and are dropped whenever a ``res.currency.rate`` changes. The
+    rate selection is the one of ``res.currency._get_rates``.
+    """
+    _name = 'almus.currency.rate.matrix'
+    _description = 'Currency Rate Matrix'
+
+    def _get_matrix(self):
+        return self.env.cr.precommit.data.setdefault(RATE_MATRIX_KEY, {})
+
+    @api.model
+    def _load_rates(self, keys):
+        """Load the rates of the given (currency_id, company_id, date) triples.
+
+        :return: dict {(currency_id, company_id, date): rate}
+        """
+        matrix = self._get_matrix()
+        missing = [key for key in set(keys) if key not in matrix]
+        if missing:
+            self.env['res.currency.rate'].flush_model(['rate', 'currency_id', 'company_id', 'name'])
+            self.env['res.company'].flush_model(['parent_path'])
+            rows = execute_values(self.env.cr, """
+                SELECT k.currency_id, k.company_id, k.date, COALESCE(r.rate, f.rate, 1.0)
+                  FROM (VALUES %s) AS k(currency_id, company_id, date)
+                  JOIN res_company c ON c.id = k.company_id
+             LEFT JOIN LATERAL (
+                       SELECT rate
+                         FROM res_currency_rate
+                        WHERE currency_id = k.currency_id
+                          AND name <= k.date
+                          AND (company_id IS NULL
+                               OR company_id = split_part(c.parent_path, '/', 1)::int)
+                     ORDER BY company_id, name DESC
+                        LIMIT 1
+                   ) r ON TRUE
+             -- Sin tasa anterior a la fecha: la primera tasa, como res.currency._get_rates
+             LEFT JOIN LATERAL (
+                       SELECT rate
+                         FROM res_currency_rate
+                        WHERE r.rate IS NULL
+                          AND currency_id = k.currency_id
+                          AND (company_id IS NULL
+                               OR company_id = split_part(c.parent_path, '/', 1)::int)
+                     ORDER BY company_id, name ASC
+                        LIMIT 1
+                   ) f ON TRUE
+            """, missing, template='(%s::int, %s::int, %s::date)', page_size=len(missing), fetch=True)
+            for currency_id, company_id, date, rate in rows:
+                matrix[currency_id, company_id, date] = rate
+        return matrix
+
+    @api.model
+    def _get_conversion_rates(self, keys):
+        """Conversion rates of many (from, to, company, date) combinations at once.
+
+        Same result as ``res.currency._get_conversion_rate``.
+
+        :param keys: iterable of (from_currency_id, to_currency_id, company_id, date)
+        :return: dict {(from_currency_id, to_currency_id, company_id, date): rate}
+        """
+        keys = {
+            (from_id, to_id, company_id, fields.Date.to_date(date))
+            for from_id, to_id, company_id, date in keys
+        }
+        matrix = self._load_rates(
+            (currency_id, company_id, date)
+            for from_id, to_id, company_id, date in keys
+            if from_id != to_id
+            for currency_id in (from_id, to_id)
+        )
+        return {
+            (from_id, to_id, company_id, date):
+                1.0 if from_id == to_id
+                else matrix[to_id, company_id, date] / matrix[from_id, company_id, date]
+            for from_id, to_id, company_id, date in keys
+        }
+
+    @api.model
+    def _get_conversion_rate(self, from_currency, to_currency, company, date):
+        """Single conversion rate, read from the matrix"""
+        date = fields.Date.to_date(date)
+        key = (from_currency.id, to_currency.id, company.id, date)
+        return self._get_conversion_rates([key])[key]
+
+    @api.model
+    def _invalidate(self):
+        self.env.cr.precommit.data.pop(RATE_MATRIX_KEY, None)
@@ -0,0 +1,23 @@
+from odoo import api, models
+
+
+class ResCurrencyRate(models.Model):
+    _inherit = 'res.currency.rate'
+
+    # Cualquier cambio de tasas invalida la matriz de la transacción
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        rates = super().create(vals_list)
+        self.env['almus.currency.rate.matrix']._invalidate()
+        return rates
+
+    def write(self, vals):
+        res = super().write(vals)
+        self.env['almus.currency.rate.matrix']._invalidate()
+        return res
+
+    def unlink(self):
+        res = super().unlink()
+        self.env['almus.currency.rate.matrix']._invalidate()
+        return res
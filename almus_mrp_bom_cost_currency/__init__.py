@@ -1,3 +1,9 @@
 # -*- coding: utf-8 -*-
 
-from . import models
\ No newline at end of file
+from . import models
+from . import wizard
+
+
+def post_init_hook(env):
+    """Construir el índice de dónde se usa y las BOMs principales para las BOMs existentes"""
+    env['almus.bom.where.used']._rebuild()
@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Manufacturing Cost in Alternative Currency',
-    'version': '17.0.1.0.0',
+    'version': '17.0.1.8.0',
     'category': 'Manufacturing/Manufacturing',
     'summary': 'Calculate manufacturing cost in alternative currency based on BOM components',
     'description': """
@@ -27,9 +27,14 @@
         'almus_product_cost_currency',
     ],
     'data': [
+        'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
+        'wizard/manufacturing_cost_simulation_wizard_views.xml',
         'views/product_views.xml',
+        'views/res_config_settings_views.xml',
         'views/product_pricelist_item_views.xml',
     ],
+    'post_init_hook': 'post_init_hook',
     'installable': True,
     'application': False,
     'auto_install': False,
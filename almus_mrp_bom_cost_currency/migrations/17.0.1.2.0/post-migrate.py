@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """Construir el índice de dónde se usa para las BOMs existentes"""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['almus.bom.where.used']._rebuild()
@@ -0,0 +1,9 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, SUPERUSER_ID
+
+
+def migrate(cr, version):
+    """Reconstruir el índice de dónde se usa por compañía"""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['almus.bom.where.used']._rebuild()
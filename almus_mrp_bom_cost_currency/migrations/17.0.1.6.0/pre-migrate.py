@@ -0,0 +1,10 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tools.sql import table_exists
+
+
+def migrate(cr, version):
+    """Vaciar el índice de dónde se usa: sus filas pasan a ser por compañía"""
+    # Desde versiones anteriores al índice la tabla aún no existe
+    if table_exists(cr, 'almus_bom_where_used'):
+        cr.execute("DELETE FROM almus_bom_where_used")
@@ -2,4 +2,10 @@
 
 from . import product_product
 from . import product_template
-from . import product_pricelist_item
\ No newline at end of file
+from . import product_pricelist_item
+from . import almus_bom_where_used
+from . import almus_product_main_bom
+from . import almus_alt_cost_job
+from . import mrp_bom
+from . import res_config_settings
+from . import res_company
@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models, _
+from odoo.tools.safe_eval import safe_eval
+
+# Workers que procesan las tareas en paralelo, el primero es el del módulo base
+WORKER_CRON_XMLIDS = [
+    'almus_product_cost_currency.ir_cron_process_alt_cost_jobs',
+    'almus_mrp_bom_cost_currency.ir_cron_process_alt_cost_jobs_2',
+    'almus_mrp_bom_cost_currency.ir_cron_process_alt_cost_jobs_3',
+    'almus_mrp_bom_cost_currency.ir_cron_process_alt_cost_jobs_4',
+]
+
+
+class AlmusAltCostJob(models.Model):
+    _inherit = 'almus.alt.cost.job'
+
+    job_type = fields.Selection(selection_add=[
+        ('manufacturing_rollup', 'Manufacturing Cost Rollup'),
+    ], ondelete={'manufacturing_rollup': 'cascade'})
+
+    @api.model
+    def _get_worker_crons(self):
+        """Active crons processing the jobs, each one is a parallel worker"""
+        crons = self.env['ir.cron']
+        for xmlid in WORKER_CRON_XMLIDS:
+            crons |= self.env.ref(xmlid, raise_if_not_found=False) or crons
+        return crons.filtered('active')
+
+    @api.model
+    def _enqueue_manufacturing_rollup(self, partitions):
+        """Queue one rollup job per independent part of the BOM graph.
+
+        Each part is processed by a worker cron on its own cursor; the parts
+        share no manufactured product nor template, so the workers never
+        update the same rows.
+
+        :param partitions: list of lists of product ids
+        :return: the created jobs
+        """
+        company = self.env.company
+        self.search([
+            ('job_type', '=', 'manufacturing_rollup'),
+            ('company_id', '=', company.id),
+            ('state', 'in', ('pending', 'running')),
+        ])._request_cancel()
+        jobs = self.create([{
+            'name': _('Manufacturing cost rollup (%(part)s/%(count)s)', part=index, count=len(partitions)),
+            'job_type': 'manufacturing_rollup',
+            'company_id': company.id,
+            'domain': repr([('id', 'in', part)]),
+        } for index, part in enumerate(partitions, 1)])
+        for cron in self._get_worker_crons()[:len(jobs)]:
+            cron._trigger()
+        return jobs
+
+    def _get_product_domain(self):
+        self.ensure_one()
+        if self.job_type == 'manufacturing_rollup':
+            return safe_eval(self.domain or '[]')
+        return super()._get_product_domain()
+
+    def _get_chunk_processor(self):
+        """Roll up the remaining products of the part at once, then write them chunk by chunk.
+
+        Each product, shared sub-assemblies included, is computed once per
+        run; the results only depend on committed data, so they stay valid
+        across the commits of the chunks.
+        """
+        self.ensure_one()
+        if self.job_type != 'manufacturing_rollup':
+            return super()._get_chunk_processor()
+        products = self.env['product.product'].with_company(self.company_id).with_context(active_test=False).search(
+            self._get_product_domain() + [('id', '>', self.last_product_id)]
+        )
+        results = products._rollup_manufacturing_alt_costs()
+        return lambda chunk: chunk.with_company(self.company_id)._write_manufacturing_costs(results)
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models
+from odoo.tools import split_every
+from psycopg2.extras import execute_values
+from collections import defaultdict
+import logging
+
+from .product_product import _strongly_connected_components
+
+_logger = logging.getLogger(__name__)
+
+# Clave de los productos pendientes de reindexar en cr.precommit.data
+WHERE_USED_DIRTY_KEY = 'almus_mrp_bom_cost_currency.where_used_dirty'
+# Filas del índice por sentencia al reconstruirlo
+CLOSURE_INSERT_BATCH_SIZE = 1000
+
+
+class AlmusBomWhereUsed(models.Model):
+    """Where-used closure of the main BOMs, per company.
+
+    One row per (component, ancestor, company): ``product_id`` is
+    manufactured, directly or through sub-assemblies, from ``component_id``
+    with the main BOMs of ``company_id``, and ``quantity`` is the cumulative
+    quantity of component per unit of the ancestor. The main BOM of each
+    product follows ``product.product._get_main_boms`` for that company
+    (variant before template, sequence, id, among the BOMs shared or of the
+    company), so the rows of a company match its cost rollup.
+
+    Rows are rebuilt incrementally: when the BOM of a product changes, only
+    the rows of that product and of its ancestors are recomputed, together
+    with their ``almus.product.main.bom`` rows.
+    """
+    _name = 'almus.bom.where.used'
+    _description = 'BOM Where-Used Closure'
+    _log_access = False
+
+    component_id = fields.Many2one(
+        'product.product',
+        string='Component',
+        required=True,
+        ondelete='cascade'
+    )
+
+    product_id = fields.Many2one(
+        'product.product',
+        string='Manufactured Product',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    quantity = fields.Float(
+        string='Cumulative Quantity',
+        digits='Product Unit of Measure',
+        help='Quantity of component per unit of the manufactured product, across all BOM levels'
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade'
+    )
+
+    depth = fields.Integer(
+        string='Depth',
+        help='Longest BOM path between the manufactured product and the component'
+    )
+
+    _sql_constraints = [
+        ('component_product_company_uniq', 'unique(component_id, product_id, company_id)',
+         'A component can only appear once per manufactured product and company.'),
+    ]
+
+    @api.model
+    def _mark_dirty(self, product_ids):
+        """Record products whose main BOM changed; reindexed before next use or at commit"""
+        product_ids = {product_id for product_id in product_ids if product_id}
+        if not product_ids:
+            return
+        data = self.env.cr.precommit.data
+        if WHERE_USED_DIRTY_KEY not in data:
+            data[WHERE_USED_DIRTY_KEY] = set()
+            self.env.cr.precommit.add(self.sudo()._flush_dirty)
+        data[WHERE_USED_DIRTY_KEY].update(product_ids)
+
+    @api.model
+    def _flush_dirty(self):
+        product_ids = self.env.cr.precommit.data.pop(WHERE_USED_DIRTY_KEY, None)
+        if product_ids:
+            self._rebuild(product_ids)
+
+    @api.model
+    def _get_ancestors(self, product_ids, company_id=None):
+        """Products manufactured, directly or not, from the given products.
+
+        :param company_id: only follow the main BOMs of this company, the BOMs
+            of every company by default (the widest affected set)
+        :return: dict {ancestor_id: depth} where depth is the longest BOM path
+        """
+        self._flush_dirty()
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT product_id, MAX(depth)
+              FROM almus_bom_where_used
+             WHERE component_id = ANY(%s)
+               AND (%s IS NULL OR company_id = %s)
+          GROUP BY product_id
+        """, (list(product_ids), company_id, company_id))
+        return dict(self.env.cr.fetchall())
+
+    @api.model
+    def _get_multipliers(self, component_ids, company_id):
+        """Cumulative quantities of the components in each of their ancestors.
+
+        :param company_id: company whose main BOMs are followed
+        :return: list of (component_id, ancestor_id, quantity)
+        """
+        self._flush_dirty()
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT component_id, product_id, quantity
+              FROM almus_bom_where_used
+             WHERE component_id = ANY(%s)
+               AND company_id = %s
+        """, (list(component_ids), company_id))
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _get_components(self, product_ids, company_id):
+        """Components, at every BOM level, of the given manufactured products.
+
+        :param company_id: company whose main BOMs are followed
+        :return: list of (product_id, component_id)
+        """
+        self._flush_dirty()
+        self.flush_model()
+        self.env.cr.execute("""
+            SELECT product_id, component_id
+              FROM almus_bom_where_used
+             WHERE product_id = ANY(%s)
+               AND company_id = %s
+        """, (list(product_ids), company_id))
+        return self.env.cr.fetchall()
+
+    @api.model
+    def _rebuild(self, product_ids=None):
+        """Recompute the closure rows of the products and of their ancestors.
+
+        The ancestors are found by walking the BOM lines upwards from the
+        changed products, each product being visited once. The closures are
+        then built bottom-up from the main BOM of each of these products and
+        the unchanged closure rows of its other components, so a shared
+        sub-assembly is expanded once and not once per path.
+
+        :param product_ids: products whose main BOM changed, all products if None
+        :return: number of closure rows written
+        """
+        self.env['mrp.bom'].flush_model()
+        self.env['mrp.bom.line'].flush_model()
+        self.env['product.product'].flush_model(['product_tmpl_id'])
+        self.env['res.company'].flush_model()
+        cr = self.env.cr
+        if product_ids is None:
+            cr.execute("DELETE FROM almus_bom_where_used")
+            cr.execute("DELETE FROM almus_product_main_bom")
+            cr.execute("""
+                SELECT DISTINCT pp.id
+                  FROM product_product pp
+                  JOIN mrp_bom b
+                    ON (b.product_id = pp.id
+                        OR (b.product_id IS NULL AND b.product_tmpl_id = pp.product_tmpl_id))
+                   AND b.active
+            """)
+        else:
+            cr.execute("""
+                WITH RECURSIVE affected(product_id) AS (
+                    SELECT unnest(%(product_ids)s::integer[])
+                     UNION
+                    SELECT pp.id
+                      FROM affected a
+                      JOIN mrp_bom_line l ON l.product_id = a.product_id
+                      JOIN mrp_bom b ON b.id = l.bom_id AND b.active
+                      JOIN product_product pp
+                        ON (b.product_id = pp.id
+                            OR (b.product_id IS NULL AND b.product_tmpl_id = pp.product_tmpl_id))
+                )
+                SELECT product_id FROM affected
+                 UNION
+                -- Ancestros que ya no los usan: sus filas también cambian
+                SELECT product_id FROM almus_bom_where_used WHERE component_id = ANY(%(product_ids)s)
+            """, {'product_ids': list(product_ids)})
+        root_ids = {row[0] for row in cr.fetchall()}
+        if product_ids is not None:
+            cr.execute("DELETE FROM almus_bom_where_used WHERE product_id = ANY(%s)", (list(root_ids),))
+            cr.execute("DELETE FROM almus_product_main_bom WHERE product_id = ANY(%s)", (list(root_ids),))
+
+        # BOM principal de cada producto para cada compañía: la variante antes que la
+        # plantilla, luego secuencia e id, entre las BOMs compartidas o de la compañía
+        cr.execute("""
+            INSERT INTO almus_product_main_bom (company_id, product_id, bom_id)
+            SELECT DISTINCT ON (rc.id, pp.id) rc.id, pp.id, b.id
+              FROM res_company rc
+              JOIN mrp_bom b
+                ON b.active
+               AND (b.company_id IS NULL OR b.company_id = rc.id)
+              JOIN product_product pp
+                ON (b.product_id = pp.id
+                    OR (b.product_id IS NULL AND b.product_tmpl_id = pp.product_tmpl_id))
+             WHERE pp.id = ANY(%s)
+          ORDER BY rc.id, pp.id, b.product_id IS NULL, b.sequence, b.id
+        """, (list(root_ids),))
+        cr.execute("""
+            SELECT m.company_id, m.product_id, l.product_id,
+                   SUM(l.product_qty) / COALESCE(NULLIF(b.product_qty, 0), 1.0)
+              FROM almus_product_main_bom m
+              JOIN mrp_bom b ON b.id = m.bom_id
+              JOIN mrp_bom_line l ON l.bom_id = b.id
+             WHERE m.product_id = ANY(%s)
+          GROUP BY m.company_id, m.product_id, l.product_id, b.product_qty
+        """, (list(root_ids),))
+        edges = defaultdict(list)
+        for company_id, product_id, component_id, quantity in cr.fetchall():
+            edges[company_id, product_id].append((component_id, quantity))
+
+        # Los componentes fuera de los productos afectados conservan sus filas
+        closures = defaultdict(dict)
+        kept_ids = {component_id for lines in edges.values() for component_id, _qty in lines} - root_ids
+        if kept_ids:
+            cr.execute("""
+                SELECT company_id, product_id, component_id, quantity, depth
+                  FROM almus_bom_where_used
+                 WHERE product_id = ANY(%s)
+            """, (list(kept_ids),))
+            for company_id, product_id, component_id, quantity, depth in cr.fetchall():
+                closures[company_id, product_id][component_id] = (quantity, depth)
+
+        graph = {
+            key: [(key[0], component_id) for component_id, _qty in lines]
+            for key, lines in edges.items()
+        }
+        rows = []
+        for scc in _strongly_connected_components(graph):
+            members = set(scc)
+            for key in scc:
+                company_id, product_id = key
+                closure = closures[key]
+                for component_id, quantity in edges[key]:
+                    sub_key = (company_id, component_id)
+                    self._add_to_closure(closure, component_id, quantity, 1)
+                    # Dentro de un ciclo no se expande: el ciclo lo reporta el cálculo de costos
+                    if sub_key in members:
+                        continue
+                    for sub_component_id, (sub_quantity, sub_depth) in closures.get(sub_key, {}).items():
+                        self._add_to_closure(closure, sub_component_id, quantity * sub_quantity, sub_depth + 1)
+                rows += [
+                    (component_id, product_id, company_id, quantity, depth)
+                    for component_id, (quantity, depth) in closure.items()
+                ]
+        for batch in split_every(CLOSURE_INSERT_BATCH_SIZE, rows):
+            execute_values(cr, """
+                INSERT INTO almus_bom_where_used (component_id, product_id, company_id, quantity, depth)
+                VALUES %s
+            """, batch, page_size=len(batch))
+        count = len(rows)
+        self.invalidate_model()
+        self.env['almus.product.main.bom'].invalidate_model()
+        _logger.debug("Rebuilt %s where-used rows", count)
+        return count
+
+    @api.model
+    def _add_to_closure(self, closure, component_id, quantity, depth):
+        """Add one BOM path to a closure: quantities are summed, the longest depth kept"""
+        previous_quantity, previous_depth = closure.get(component_id, (0.0, 0))
+        closure[component_id] = (previous_quantity + quantity, max(previous_depth, depth))
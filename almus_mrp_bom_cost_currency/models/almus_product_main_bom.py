@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models
+
+
+class AlmusProductMainBom(models.Model):
+    """Main active BOM of each product, per company.
+
+    Precedence: the BOM of the variant before the BOM of the template, then
+    sequence and id, among the BOMs shared or of the company. Rows are kept
+    by ``almus.bom.where.used._rebuild`` together with the where-used
+    closure, so the cost rollup, pricing and the closure all resolve the
+    same BOM. Read it through ``product.product._get_main_boms``.
+    """
+    _name = 'almus.product.main.bom'
+    _description = 'Product Main BOM'
+    _log_access = False
+
+    product_id = fields.Many2one(
+        'product.product',
+        string='Product',
+        required=True,
+        ondelete='cascade'
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade'
+    )
+
+    bom_id = fields.Many2one(
+        'mrp.bom',
+        string='Main BOM',
+        required=True,
+        ondelete='cascade'
+    )
+
+    _sql_constraints = [
+        ('product_company_uniq', 'unique(product_id, company_id)',
+         'A product can only have one main BOM per company.'),
+    ]
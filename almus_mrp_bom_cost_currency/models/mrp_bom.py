@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, models
+
+# Campos de mrp.bom que cambian la BOM principal o sus cantidades
+WHERE_USED_BOM_FIELDS = {'active', 'company_id', 'product_id', 'product_tmpl_id', 'product_qty', 'sequence', 'bom_line_ids'}
+WHERE_USED_LINE_FIELDS = {'bom_id', 'product_id', 'product_qty'}
+
+
+class MrpBom(models.Model):
+    _inherit = 'mrp.bom'
+
+    def _get_where_used_product_ids(self):
+        """Products whose main BOM may be one of these BOMs"""
+        product_ids = set()
+        for bom in self.with_context(active_test=False):
+            if bom.product_id:
+                product_ids.add(bom.product_id.id)
+            else:
+                product_ids.update(bom.product_tmpl_id.product_variant_ids.ids)
+        return product_ids
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        boms = super().create(vals_list)
+        self.env['almus.bom.where.used']._mark_dirty(boms._get_where_used_product_ids())
+        return boms
+
+    def write(self, vals):
+        tracked = WHERE_USED_BOM_FIELDS.intersection(vals)
+        product_ids = self._get_where_used_product_ids() if tracked else set()
+        res = super().write(vals)
+        if tracked:
+            self.env['almus.bom.where.used']._mark_dirty(product_ids | self._get_where_used_product_ids())
+        return res
+
+    def unlink(self):
+        product_ids = self._get_where_used_product_ids()
+        res = super().unlink()
+        self.env['almus.bom.where.used']._mark_dirty(product_ids)
+        return res
+
+
+class MrpBomLine(models.Model):
+    _inherit = 'mrp.bom.line'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        self.env['almus.bom.where.used']._mark_dirty(lines.bom_id._get_where_used_product_ids())
+        return lines
+
+    def write(self, vals):
+        tracked = WHERE_USED_LINE_FIELDS.intersection(vals)
+        product_ids = self.bom_id._get_where_used_product_ids() if tracked else set()
+        res = super().write(vals)
+        if tracked:
+            self.env['almus.bom.where.used']._mark_dirty(product_ids | self.bom_id._get_where_used_product_ids())
+        return res
+
+    def unlink(self):
+        product_ids = self.bom_id._get_where_used_product_ids()
+        res = super().unlink()
+        self.env['almus.bom.where.used']._mark_dirty(product_ids)
+        return res
@@ -25,9 +25,7 @@ class ProductPricelistItem(models.Model):
         for item in self:
             if item.base == 'manufacturing_alt_cost':
                 # Verificar configuración global de moneda alternativa
-                alt_currency_id = self.env['ir.config_parameter'].sudo().get_param(
-                    'almus_product_cost_currency.alt_currency_id'
-                )
+                alt_currency_id = self.env['product.product']._get_alt_currency_param_id()
                 if not alt_currency_id:
                     raise ValidationError(_(
                         'You must configure an alternative currency in settings before using '
@@ -65,48 +63,31 @@ class ProductPricelistItem(models.Model):
                     'Please create specific rules for each variant.'
                 ))
         
-        # Verificar que el producto tenga moneda alternativa configurada
-        if not product.alt_currency_id:
-            # Intentar obtener la moneda por defecto del parámetro de configuración
-            param = self.env['ir.config_parameter'].sudo().get_param(
-                'almus_product_cost_currency.alt_currency_id'
-            )
-            if param:
-                try:
-                    default_alt_currency_id = int(param)
-                    # Asignar temporalmente para este cálculo (no guardar)
-                    product = product.with_context(temp_alt_currency=default_alt_currency_id)
-                    product.alt_currency_id = default_alt_currency_id
-                except (ValueError, TypeError):
-                    _logger.error(
-                        "Invalid alternative currency parameter: %s",
-                        param
-                    )
-                    raise ValidationError(_(
-                        'Invalid alternative currency configuration. '
-                        'Please check system settings.'
-                    ))
-            else:
-                raise ValidationError(_(
-                    'Product %s does not have an alternative currency configured, '
-                    'and no default alternative currency is set in system settings.',
-                    product.display_name
-                ))
+        # Verificar que el producto tenga moneda alternativa (propia o heredada)
+        src_currency = product.effective_alt_currency_id
+        if not src_currency:
+            raise ValidationError(_(
+                'Product %s does not have an alternative currency configured, '
+                'and no default alternative currency is set in system settings.',
+                product.display_name
+            ))
         
         # Determinar qué costo usar basado en si el producto es manufacturado
         try:
-            if product.has_bom():
+            # La BOM principal y el costo almacenado son los de la misma compañía
+            manufacturing_product = product.with_company(product._get_manufacturing_cost_company())
+            if manufacturing_product.has_bom():
                 # Producto manufacturado: usar manufacturing_alt_cost
-                price = product.manufacturing_alt_cost
+                price = manufacturing_product.manufacturing_alt_cost
                 
                 # Solo advertir si el estado no es OK y el costo es 0
-                if product.manufacturing_cost_state != 'ok' and price <= 0:
+                if manufacturing_product.manufacturing_cost_state != 'ok' and price <= 0:
                     # Log discreto sin mostrar al usuario
                     _logger.debug(
                         'Product %s (ID: %s) has manufacturing cost issues. State: %s',
                         product.display_name,
                         product.id,
-                        product.manufacturing_cost_state
+                        manufacturing_product.manufacturing_cost_state
                     )
             else:
                 # Producto comprado: usar alt_cost como fallback
@@ -129,19 +110,15 @@ class ProductPricelistItem(models.Model):
             # Fallback seguro
             price = 0.0
         
-        # Obtener moneda origen
-        src_currency = product.alt_currency_id
-        
         # Conversión de moneda si es necesario
         if src_currency and src_currency != currency:
             try:
-                # Usar el método _convert con manejo de errores
-                price = src_currency._convert(
-                    price, 
+                # Tasa de la matriz de la transacción (sin redondear, se hará después)
+                price *= self.env['almus.currency.rate.matrix']._get_conversion_rate(
+                    src_currency, 
                     currency, 
                     self.env.company, 
-                    date, 
-                    round=False  # No redondear aquí, se hará después
+                    date
                 )
             except Exception as e:
                 _logger.error(
@@ -182,9 +159,7 @@ class ProductPricelistItem(models.Model):
         """Mostrar advertencia cuando se selecciona manufacturing_alt_cost"""
         if self.base == 'manufacturing_alt_cost':
             # Verificar si hay moneda alternativa configurada
-            alt_currency_id = self.env['ir.config_parameter'].sudo().get_param(
-                'almus_product_cost_currency.alt_currency_id'
-            )
+            alt_currency_id = self.env['product.product']._get_alt_currency_param_id()
             if not alt_currency_id:
                 return {
                     'warning': {
@@ -215,13 +190,8 @@ class ProductPricelistItem(models.Model):
             # Verificar que el producto tenga configuración válida
             # (pero no lanzar excepción aquí, solo retornar False)
             if product._name == 'product.product':
-                if not product.alt_currency_id:
-                    # Verificar si hay moneda por defecto
-                    param = self.env['ir.config_parameter'].sudo().get_param(
-                        'almus_product_cost_currency.alt_currency_id'
-                    )
-                    if not param:
-                        return False
+                if not product.effective_alt_currency_id:
+                    return False
         
         return res
 
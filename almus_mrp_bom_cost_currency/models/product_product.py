@@ -2,17 +2,88 @@
 
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
-from odoo.tools import float_round
-from functools import lru_cache
+from odoo.tools import config, float_round, ormcache, split_every
+from psycopg2.extras import execute_values
 from collections import defaultdict
 import logging
 
 _logger = logging.getLogger(__name__)
 
-# Constantes de configuración
-MAX_BOM_RECURSION_DEPTH = 20  # Límite máximo de anidamiento de BOMs
-BATCH_SIZE = 100  # Tamaño de lote para procesamiento masivo
-CURRENCY_CACHE_SIZE = 128  # Tamaño del caché de conversión de moneda
+try:
+    import numpy as np
+except ImportError:
+    np = None
+    _logger.debug("NumPy not available: manufacturing cost simulations are disabled")
+
+DELTA_UPDATE_PARAM = 'almus_mrp_bom_cost_currency.delta_update'
+ROLLUP_WORKERS_PARAM = 'almus_mrp_bom_cost_currency.rollup_workers'
+# Productos por sentencia al escribir los costos de fabricación
+COST_WRITE_BATCH_SIZE = 1000
+
+
+def _strongly_connected_components(graph):
+    """Tarjan's algorithm, iterative so that deep BOMs do not hit the recursion limit.
+
+    :param graph: dict {node: iterable of successors}, successors missing
+        from the keys are ignored
+    :return: list of SCCs (lists of nodes), every SCC after all the SCCs
+        reachable from it, i.e. components before the products made from them
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+    sccs = []
+    for root in graph:
+        if root in index:
+            continue
+        index[root] = lowlink[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        work = [(root, iter(graph[root]))]
+        while work:
+            node, successors = work[-1]
+            for successor in successors:
+                if successor not in graph:
+                    continue
+                if successor not in index:
+                    index[successor] = lowlink[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph[successor])))
+                    break
+                if successor in on_stack:
+                    lowlink[node] = min(lowlink[node], index[successor])
+            else:
+                work.pop()
+                if work:
+                    parent = work[-1][0]
+                    lowlink[parent] = min(lowlink[parent], lowlink[node])
+                if lowlink[node] == index[node]:
+                    scc = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        scc.append(member)
+                        if member == node:
+                            break
+                    sccs.append(scc)
+    return sccs
+
+
+def _find_cycle(graph, members):
+    """One cycle through the nodes of a strongly connected component, as a closed path"""
+    members = set(members)
+    start = min(members)
+    path = [start]
+    position = {start: 0}
+    node = start
+    while True:
+        node = next(successor for successor in graph[node] if successor in members)
+        if node in position:
+            return path[position[node]:] + [node]
+        position[node] = len(path)
+        path.append(node)
 
 
 class ProductProduct(models.Model):
@@ -22,7 +93,7 @@ class ProductProduct(models.Model):
         string='Manufacturing Alt. Cost',
         compute='_compute_manufacturing_alt_cost',
         store=True,
-        currency_field='alt_currency_id',
+        currency_field='effective_alt_currency_id',
         digits='Product Price',  # Usar precisión configurada
         help='Manufacturing cost calculated from BOM components alternative costs'
     )
@@ -38,359 +109,726 @@ class ProductProduct(models.Model):
        store=True,
        help='State of the manufacturing cost calculation')
 
-    @api.model
-    @lru_cache(maxsize=CURRENCY_CACHE_SIZE)
-    def _get_currency_rate_cached(self, from_currency_id, to_currency_id, company_id, date_str):
-        """
-        Caché de tasas de cambio para evitar consultas repetitivas
-        Nota: Usamos date_str porque date objects no son hashables
-        """
-        from_currency = self.env['res.currency'].browse(from_currency_id)
-        to_currency = self.env['res.currency'].browse(to_currency_id)
-        company = self.env['res.company'].browse(company_id)
-        date = fields.Date.from_string(date_str)
-        
-        # Si las monedas son iguales, no hay conversión
-        if from_currency_id == to_currency_id:
-            return 1.0
-        
-        # Calcular tasa usando el método interno de Odoo
-        return from_currency._get_conversion_rate(
-            from_currency, 
-            to_currency, 
-            company, 
-            date
-        )
+    manufacturing_cost_message = fields.Char(
+        string='Manufacturing Cost Issue',
+        compute='_compute_manufacturing_alt_cost',
+        store=True,
+        help='Details of the manufacturing cost calculation issue, e.g. the BOM cycle found'
+    )
 
     @api.depends('bom_ids', 'bom_ids.bom_line_ids', 'bom_ids.bom_line_ids.product_id.alt_cost',
                  'bom_ids.bom_line_ids.product_id.manufacturing_alt_cost')
     def _compute_manufacturing_alt_cost(self):
-        """Compute manufacturing alternative cost with batch processing"""
-        
-        # Dividir en lotes para mejor rendimiento
-        all_products = self
-        total = len(all_products)
-        
-        # Pre-cargar BOMs para todos los productos
-        all_product_ids = all_products.ids
-        boms_data = self.env['mrp.bom'].search_read(
-            [
-                ('active', '=', True),
-                '|',
-                    ('product_id', 'in', all_product_ids),
-                    '&',
-                        ('product_tmpl_id', 'in', all_products.mapped('product_tmpl_id').ids),
-                        ('product_id', '=', False),
-                '|',
-                    ('company_id', '=', False),
-                    ('company_id', '=', self.env.company.id),
-            ],
-            ['product_id', 'product_tmpl_id', 'product_qty']
-        )
-        
-        # Crear mapeo rápido de producto -> BOM
-        product_bom_map = {}
-        template_bom_map = defaultdict(list)
-        
-        for bom in boms_data:
-            if bom['product_id']:
-                product_bom_map[bom['product_id'][0]] = bom['id']
-            else:
-                template_bom_map[bom['product_tmpl_id'][0]].append(bom['id'])
-        
-        # Procesar en lotes
-        for i in range(0, total, BATCH_SIZE):
-            batch = all_products[i:i + BATCH_SIZE]
-            
-            # Limpiar caché para cada lote
-            self._get_currency_rate_cached.cache_clear()
-            
-            # Crear caché de BOMs para el lote
-            bom_cache = {}
-            
-            for product in batch:
-                try:
-                    # Buscar BOM en mapeo pre-cargado
-                    if product.id in product_bom_map:
-                        bom_cache[product.id] = self.env['mrp.bom'].browse(product_bom_map[product.id])
-                    elif product.product_tmpl_id.id in template_bom_map:
-                        # Tomar el primer BOM del template
-                        bom_ids = template_bom_map[product.product_tmpl_id.id]
-                        if bom_ids:
-                            bom_cache[product.id] = self.env['mrp.bom'].browse(bom_ids[0])
-                    
-                    cost, state = product._calculate_manufacturing_cost_recursive(
-                        bom_cache=bom_cache,
-                        depth=0
-                    )
-                    
-                    product.manufacturing_alt_cost = cost
-                    product.manufacturing_cost_state = state
-                    
-                except Exception as e:
-                    _logger.error(
-                        "Failed to calculate manufacturing cost for product %s (ID: %s): %s",
-                        product.display_name, product.id, str(e),
-                        exc_info=True
-                    )
-                    product.manufacturing_alt_cost = 0.0
-                    product.manufacturing_cost_state = 'error'
-
-    def _calculate_manufacturing_cost_recursive(self, visited_products=None, bom_cache=None, depth=0):
+        """Compute manufacturing alternative cost with the BOM rollup engine.
+
+        Stored products are persisted by ``_write_manufacturing_costs``, which
+        only writes the rows whose values changed; records not yet in the
+        database (onchange) are assigned as usual.
+
+        The stored costs follow a single company, the one returned by
+        ``_get_manufacturing_cost_company``, whatever the current company.
+        """
+        results = self.with_company(self._get_manufacturing_cost_company())._rollup_manufacturing_alt_costs()
+        stored = self.filtered(lambda product: isinstance(product.id, int))
+        for product in self - stored:
+            (product.manufacturing_alt_cost,
+             product.manufacturing_cost_state,
+             product.manufacturing_cost_message) = results[product.id]
+        changed = stored._write_manufacturing_costs(results)
+        _logger.debug("Manufacturing cost computed for %s products, %s changed", len(stored), changed)
+
+    def _get_main_boms(self):
+        """Main active BOM of each product of ``self`` for the current company.
+
+        Every caller (cost rollup, ``_get_main_bom``, ``has_bom`` and pricing)
+        goes through this resolver, so they all pick the same BOM. The main
+        BOMs are stored per company in ``almus.product.main.bom`` and kept up
+        to date with the where-used closure.
+
+        :return: dict {product_id: mrp.bom ID}
         """
-        Calculate manufacturing cost recursively with optimizations
-        Returns: (cost, state)
+        # Los registros nuevos (onchange) no tienen BOM en la base de datos
+        product_ids = [product_id for product_id in self._ids if product_id]
+        if not product_ids:
+            return {}
+        self.env['almus.bom.where.used'].sudo()._flush_dirty()
+        self.env['almus.product.main.bom'].flush_model()
+        self._cr.execute("""
+            SELECT product_id, bom_id
+              FROM almus_product_main_bom
+             WHERE product_id = ANY(%s)
+               AND company_id = %s
+        """, (product_ids, self.env.company.id))
+        return dict(self._cr.fetchall())
+
+    def _get_bom_graph(self):
+        """Load the whole BOM graph below ``self``, one BOM level at a time.
+
+        Each level costs a constant number of queries (main BOMs, BOM
+        quantities and BOM lines of the products found at that level), so
+        shared sub-assemblies are only loaded once.
+
+        :return: tuple (main_boms, bom_qty, bom_lines) where ``main_boms`` is
+            {product_id: bom_id}, ``bom_qty`` is {bom_id: product_qty} and
+            ``bom_lines`` is {bom_id: [(component_id, product_qty), ...]}
         """
-        self.ensure_one()
-        
-        # Verificar límite de profundidad
-        if depth > MAX_BOM_RECURSION_DEPTH:
-            _logger.error(
-                "Maximum BOM recursion depth (%s) exceeded for product %s (ID: %s)",
-                MAX_BOM_RECURSION_DEPTH, self.display_name, self.id
+        main_boms = {}
+        bom_qty = {}
+        bom_lines = {}
+        seen = set()
+        # Los registros nuevos (onchange) no tienen BOM en la base de datos
+        frontier = {product_id for product_id in self.ids if product_id}
+        while frontier:
+            seen |= frontier
+            level_boms = self.browse(list(frontier))._get_main_boms()
+            main_boms.update(level_boms)
+            new_bom_ids = list(set(level_boms.values()) - set(bom_qty))
+            if not new_bom_ids:
+                break
+            for bom in self.env['mrp.bom'].browse(new_bom_ids).read(['product_qty']):
+                bom_qty[bom['id']] = bom['product_qty']
+                bom_lines[bom['id']] = []
+            lines = self.env['mrp.bom.line'].search_read(
+                [('bom_id', 'in', new_bom_ids)],
+                ['bom_id', 'product_id', 'product_qty'],
+                order='bom_id, sequence, id'
             )
-            return 0.0, 'warning'
-        
-        if visited_products is None:
-            visited_products = set()
-        
-        if bom_cache is None:
-            bom_cache = {}
-        
-        # Detectar dependencia circular
-        if self.id in visited_products:
-            if depth <= 5:  # Solo loguear en niveles superiores
-                _logger.warning(
-                    "Circular dependency detected for product %s at depth %s",
-                    self.display_name, depth
-                )
-            return 0.0, 'warning'
-        
-        # Obtener BOM del caché
-        if self.id not in bom_cache:
-            bom_cache[self.id] = self._get_main_bom()
-        main_bom = bom_cache[self.id]
-        
-        if not main_bom:
-            return 0.0, 'no_bom'
-        
-        if not main_bom.bom_line_ids:
-            return 0.0, 'empty_bom'
-        
-        # Agregar producto actual al conjunto de visitados
-        visited_products = visited_products.copy()
-        visited_products.add(self.id)
-        
-        # Preparar datos para conversión de moneda
+            for line in lines:
+                bom_lines[line['bom_id'][0]].append((line['product_id'][0], line['product_qty']))
+            frontier = {line['product_id'][0] for line in lines} - seen
+        return main_boms, bom_qty, bom_lines
+
+    @api.model
+    def _get_bom_rollup_order(self, main_boms, bom_lines):
+        """Order the manufactured products of a BOM graph bottom-up.
+
+        :param main_boms: dict {product_id: bom_id}, as from ``_get_bom_graph``
+        :param bom_lines: dict {bom_id: [(component_id, product_qty), ...]}
+        :return: tuple (order, cycles) where ``order`` lists the products
+            outside BOM cycles, components before the products made from
+            them, and ``cycles`` is {product_id: cycle path} for the others
+        """
+        graph = {
+            product_id: [component_id for component_id, _qty in bom_lines[bom_id]]
+            for product_id, bom_id in main_boms.items()
+        }
+        order = []
+        cycles = {}
+        for scc in _strongly_connected_components(graph):
+            product_id = scc[0]
+            if len(scc) == 1 and product_id not in graph[product_id]:
+                order.append(product_id)
+                continue
+            cycle = _find_cycle(graph, scc)
+            for member_id in scc:
+                cycles[member_id] = cycle
+        return order, cycles
+
+    def _rollup_manufacturing_alt_costs(self):
+        """Compute the manufacturing alternative cost of ``self`` bottom-up.
+
+        The BOM graph is loaded once and split into strongly connected
+        components (Tarjan, linear time), which come out ordered topologically:
+        components before the products made from them. Every manufactured
+        product is computed exactly once, its result being reused by all its
+        parents, with no depth limit. Products of a BOM cycle get a zero cost,
+        the ``error`` state and the cycle as message; the products using them
+        are still computed, in the ``warning`` state.
+
+        Costs are expressed in the alternative currency of each product and
+        rounded per BOM line and per unit, as before.
+
+        :return: dict {product_id: (cost, state, message)} for the products of ``self``
+        """
+        main_boms, bom_qty, bom_lines = self._get_bom_graph()
+
+        order, cycles = self._get_bom_rollup_order(main_boms, bom_lines)
+
+        all_ids = set(main_boms)
+        for lines in bom_lines.values():
+            all_ids.update(component_id for component_id, _qty in lines)
+        products = self.browse(list(all_ids))
+        products.mapped('alt_cost')  # conversión en lote para todos los componentes
+
+        # Todas las tasas del grafo en una sola consulta (matriz de la transacción)
         conversion_date = fields.Date.context_today(self)
-        conversion_date_str = fields.Date.to_string(conversion_date)
-        target_currency = self.alt_currency_id
         company = self.env.company
-        
-        # Pre-cargar líneas de BOM con sus productos
-        bom_lines_data = main_bom.bom_line_ids.read(['product_id', 'product_qty'])
-        component_ids = [line['product_id'][0] for line in bom_lines_data]
-        components = self.browse(component_ids)
-        
-        # Pre-cargar BOMs de componentes
-        for component in components:
-            if component.id not in bom_cache:
-                bom_cache[component.id] = component._get_main_bom()
-        
-        total_cost = 0.0
-        has_warning = False
-        currency_rounding = target_currency.rounding if target_currency else 0.01
-        
-        # Procesar cada línea de BOM
-        for line_data, component in zip(bom_lines_data, components):
-            component_qty = line_data['product_qty']
-            
+        currencies = {product.id: product.effective_alt_currency_id.id for product in products}
+        rates = self.env['almus.currency.rate.matrix']._get_conversion_rates({
+            (currencies[component_id], currencies[product_id], company.id, conversion_date)
+            for product_id, bom_id in main_boms.items()
+            for component_id, _qty in bom_lines[bom_id]
+            if currencies[component_id] and currencies[product_id]
+        })
+        results = {}
+        for cycle in {tuple(cycle) for cycle in cycles.values()}:
+            message = _('BOM cycle: %s', ' → '.join(self.browse(product_id).display_name for product_id in cycle))
+            _logger.warning("Manufacturing cost not computed, %s", message)
+            for product_id in set(cycle):
+                results[product_id] = (0.0, 'error', message)
+        # Resto de miembros de la componente (fuera del ciclo mostrado)
+        for product_id, cycle in cycles.items():
+            if product_id not in results:
+                results[product_id] = (0.0, 'error', results[cycle[0]][2])
+
+        for product_id in order:
+            product = self.browse(product_id)
+            bom_id = main_boms[product_id]
+            if not bom_lines[bom_id]:
+                results[product_id] = (0.0, 'empty_bom', False)
+                continue
             try:
-                # Determinar si el componente tiene BOM
-                has_bom = bool(bom_cache.get(component.id))
-                
-                # Calcular costo del componente
-                if has_bom:
-                    # Recursión con incremento de profundidad
-                    component_cost, component_state = component._calculate_manufacturing_cost_recursive(
-                        visited_products, 
-                        bom_cache,
-                        depth + 1
-                    )
-                    if component_state != 'ok':
-                        has_warning = True
-                else:
-                    # Componente comprado
-                    component_cost = component.alt_cost
-                    if not component_cost or component_cost <= 0:
+                target_currency = product.effective_alt_currency_id
+                currency_rounding = target_currency.rounding if target_currency else 0.01
+                total_cost = 0.0
+                has_warning = False
+                for component_id, component_qty in bom_lines[bom_id]:
+                    component = self.browse(component_id)
+                    try:
+                        if component_id in main_boms:
+                            component_cost, component_state, _message = results[component_id]
+                            if component_state != 'ok':
+                                has_warning = True
+                        else:
+                            # Componente comprado
+                            component_cost = component.alt_cost
+                            if not component_cost or component_cost <= 0:
+                                has_warning = True
+                                component_cost = 0.0
+
+                        # Convertir moneda si es necesario
+                        component_currency = component.effective_alt_currency_id
+                        if (component_cost > 0 and
+                            component_currency and
+                            target_currency and
+                            component_currency.id != target_currency.id):
+                            rate = rates[component_currency.id, target_currency.id, company.id, conversion_date]
+                            component_cost = component_cost * rate
+
+                        total_cost += float_round(
+                            component_cost * component_qty,
+                            precision_rounding=currency_rounding
+                        )
+                    except Exception as e:
+                        # Una línea fallida no anula el resto de la BOM
+                        _logger.warning(
+                            "Error calculating cost for component %s in BOM of %s: %s",
+                            component.display_name, product.display_name, str(e)
+                        )
                         has_warning = True
-                        component_cost = 0.0
-                
-                # Convertir moneda si es necesario
-                if (component_cost > 0 and 
-                    component.alt_currency_id and 
-                    target_currency and 
-                    component.alt_currency_id.id != target_currency.id):
-                    
-                    # Usar caché para conversión
-                    rate = self._get_currency_rate_cached(
-                        component.alt_currency_id.id,
-                        target_currency.id,
-                        company.id,
-                        conversion_date_str
-                    )
-                    component_cost = component_cost * rate
-                
-                # Calcular costo de línea con precisión correcta
-                line_cost = float_round(
-                    component_cost * component_qty,
+
+                final_cost = float_round(
+                    total_cost / (bom_qty[bom_id] or 1.0),
                     precision_rounding=currency_rounding
                 )
-                total_cost += line_cost
-                
+                results[product_id] = (final_cost, 'warning' if has_warning else 'ok', False)
             except Exception as e:
                 _logger.error(
-                    "Error calculating cost for component %s in BOM of %s: %s",
-                    component.display_name, self.display_name, str(e)
+                    "Failed to calculate manufacturing cost for product %s (ID: %s): %s",
+                    product.display_name, product.id, str(e),
+                    exc_info=True
                 )
-                has_warning = True
-                continue
-        
-        # Calcular costo unitario del producto final
-        try:
-            final_cost = float_round(
-                total_cost / (main_bom.product_qty or 1.0),
-                precision_rounding=currency_rounding
-            )
-        except (ZeroDivisionError, TypeError) as e:
-            _logger.error(
-                "Error calculating final cost for %s: %s",
-                self.display_name, str(e)
-            )
-            final_cost = 0.0
-            has_warning = True
-        
-        final_state = 'warning' if has_warning else 'ok'
-        
-        return final_cost, final_state
+                results[product_id] = (0.0, 'error', str(e))
+
+        return {
+            product.id: results.get(product.id, (0.0, 'no_bom', False))
+            for product in self
+        }
+
+    def _simulate_manufacturing_alt_costs(self, scenarios):
+        """Evaluate the manufacturing alternative costs of ``self`` under what-if scenarios.
+
+        The BOM graph is loaded once as a sparse quantity matrix (COO arrays)
+        and every scenario is a column of the cost matrix, so all scenarios
+        are rolled up together, one topological level at a time, with NumPy.
+        Nothing is written.
+
+        A scenario is a dict with the optional keys:
+
+        - ``rates``: {currency_id: rate}, hypothetical rates against the
+          company currency (same meaning as ``res.currency.rate.rate``)
+        - ``price_factor``: multiplier of the cost of every purchased component
+        - ``price_factors``: {product_id: multiplier} for specific components
+
+        Costs are not rounded per BOM line as in the stored rollup, and the
+        products of a BOM cycle cost zero.
+
+        Like the stored costs, the simulation follows the BOMs and rates of
+        the company returned by ``_get_manufacturing_cost_company``.
+
+        :param scenarios: list of scenario dicts
+        :return: list (one per scenario) of dicts {product_id: (cost, delta)}
+            for the manufactured products of ``self``, ``delta`` being the
+            difference with the stored ``manufacturing_alt_cost``
+        """
+        if np is None:
+            raise UserError(_('The Python library NumPy is required to simulate manufacturing costs.'))
+        if not scenarios:
+            return []
+        # Misma compañía que los costos almacenados con los que se compara
+        self = self.with_company(self._get_manufacturing_cost_company())
+        main_boms, bom_qty, bom_lines = self._get_bom_graph()
+        order, _cycles = self._get_bom_rollup_order(main_boms, bom_lines)
+
+        all_ids = set(main_boms)
+        for lines in bom_lines.values():
+            all_ids.update(component_id for component_id, _qty in lines)
+        node_ids = list(all_ids)
+        position = {product_id: index for index, product_id in enumerate(node_ids)}
+        products = self.browse(node_ids)
+        products.mapped('alt_cost')  # conversión en lote para todos los componentes
+
+        company = self.env.company
+        conversion_date = fields.Date.context_today(self)
+        currencies = [product.effective_alt_currency_id.id for product in products]
+        currency_ids = {currency_id for currency_id in currencies if currency_id}
+        rate_keys = {
+            (currencies[position[component_id]], currencies[position[product_id]], company.id, conversion_date)
+            for product_id, bom_id in main_boms.items()
+            for component_id, _qty in bom_lines[bom_id]
+        }
+        rate_keys.update((company.currency_id.id, currency_id, company.id, conversion_date) for currency_id in currency_ids)
+        rates = self.env['almus.currency.rate.matrix']._get_conversion_rates({
+            key for key in rate_keys if key[0] and key[1]
+        })
+
+        # Factor de cada escenario sobre la tasa actual de cada moneda
+        n_nodes, n_scenarios = len(node_ids), len(scenarios)
+        currency_factors = np.ones((n_nodes, n_scenarios))
+        price_factors = np.ones((n_nodes, n_scenarios))
+        for column, scenario in enumerate(scenarios):
+            factors = {
+                currency_id: rate / rates[company.currency_id.id, currency_id, company.id, conversion_date]
+                for currency_id, rate in (scenario.get('rates') or {}).items()
+                if currency_id in currency_ids and currency_id != company.currency_id.id and rate
+            }
+            price_factors[:, column] = scenario.get('price_factor', 1.0)
+            for product_id, factor in (scenario.get('price_factors') or {}).items():
+                if product_id in position:
+                    price_factors[position[product_id], column] = factor
+            for index, currency_id in enumerate(currencies):
+                currency_factors[index, column] = factors.get(currency_id, 1.0)
+
+        # Costo de los componentes comprados, en su moneda, por escenario
+        costs = np.zeros((n_nodes, n_scenarios))
+        for index, product in enumerate(products):
+            if product.id not in main_boms and product.alt_cost > 0:
+                costs[index] = product.alt_cost * price_factors[index] * currency_factors[index]
+
+        # Matriz dispersa de cantidades, agrupada por nivel topológico
+        levels = {}
+        rows, cols, weights, edge_levels = [], [], [], []
+        for product_id in order:
+            bom_id = main_boms[product_id]
+            lines = bom_lines[bom_id]
+            levels[product_id] = 1 + max((levels.get(component_id, 0) for component_id, _qty in lines), default=0)
+            row = position[product_id]
+            for component_id, component_qty in lines:
+                col = position[component_id]
+                weight = component_qty / (bom_qty[bom_id] or 1.0)
+                if currencies[col] and currencies[row] and currencies[col] != currencies[row]:
+                    weight *= rates[currencies[col], currencies[row], company.id, conversion_date]
+                rows.append(row)
+                cols.append(col)
+                weights.append(weight)
+                edge_levels.append(levels[product_id])
+        rows, cols = np.array(rows, dtype=np.int64), np.array(cols, dtype=np.int64)
+        weights, edge_levels = np.array(weights, dtype=float), np.array(edge_levels, dtype=np.int64)
+        # Una conversión entre monedas escala con el cociente de sus factores
+        converted = np.array([
+            bool(currencies[col] and currencies[row] and currencies[col] != currencies[row])
+            for row, col in zip(rows, cols)
+        ], dtype=bool)
+        edge_weights = np.repeat(weights[:, None], n_scenarios, axis=1)
+        if converted.any():
+            edge_weights[converted] *= currency_factors[rows[converted]] / currency_factors[cols[converted]]
+
+        for level in range(1, int(edge_levels.max(initial=0)) + 1):
+            mask = edge_levels == level
+            np.add.at(costs, rows[mask], edge_weights[mask] * costs[cols[mask]])
+
+        results = []
+        manufactured = self.filtered(lambda product: product.id in main_boms and product.id in position)
+        current = {product.id: product.manufacturing_alt_cost for product in manufactured}
+        for column in range(n_scenarios):
+            results.append({
+                product_id: (float(costs[position[product_id], column]),
+                             float(costs[position[product_id], column]) - current_cost)
+                for product_id, current_cost in current.items()
+            })
+        return results
 
     def _get_main_bom(self):
-        """Get the main active BOM for this product (optimized version)"""
+        """Get the main active BOM for this product"""
         self.ensure_one()
-        
-        # Dominio base con filtro de empresa
-        domain = [
-            ('active', '=', True),
-            '|',
-                ('company_id', '=', False),
-                ('company_id', '=', self.env.company.id),
-        ]
-        
-        # Buscar BoM específica para este producto primero
-        bom = self.env['mrp.bom'].search(
-            domain + [('product_id', '=', self.id)],
-            limit=1,
-            order='sequence, id'  # Respetar secuencia si hay múltiples
-        )
-        
-        if not bom:
-            # Buscar BoM para el template
-            bom = self.env['mrp.bom'].search(
-                domain + [
-                    ('product_tmpl_id', '=', self.product_tmpl_id.id),
-                    ('product_id', '=', False),
-                ],
-                limit=1,
-                order='sequence, id'
-            )
-        
-        return bom
+        return self.env['mrp.bom'].browse(self._get_main_boms().get(self.id))
 
     def has_bom(self):
-        """Check if product has any active BOM (cached during batch processing)"""
+        """Check if product has any active BOM (stored main BOMs)"""
         self.ensure_one()
-        # Este método será más eficiente cuando se use dentro del contexto
-        # de _compute_manufacturing_alt_cost debido al pre-cargado
-        return bool(self._get_main_bom())
+        return self.id in self._get_main_boms()
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        products = super().create(vals_list)
+        # Las nuevas variantes pueden usar la BOM de su plantilla
+        self.env['almus.bom.where.used']._mark_dirty(products.ids)
+        return products
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'product_tmpl_id' in vals:
+            # La BOM de plantilla aplicable cambia con la plantilla
+            self.env['almus.bom.where.used']._mark_dirty(self.ids)
+        return res
 
     @api.model
-    def _trigger_manufacturing_cost_recalc_for_dependents(self, changed_product_ids):
+    def _get_manufacturing_cost_fields(self):
+        """Stored manufacturing cost fields of the variants and templates"""
+        Template = self.env['product.template']
+        return [
+            self._fields['manufacturing_alt_cost'],
+            self._fields['manufacturing_cost_state'],
+            self._fields['manufacturing_cost_message'],
+            Template._fields['manufacturing_alt_cost'],
+            Template._fields['manufacturing_cost_state'],
+        ]
+
+    @api.model
+    def _get_alt_cost_dependent_fields(self):
+        return super()._get_alt_cost_dependent_fields() + self._get_manufacturing_cost_fields()
+
+    @api.model
+    @ormcache()
+    def _is_manufacturing_cost_delta_update(self):
+        """Whether component cost changes are applied to their ancestors as deltas"""
+        param = self.env['ir.config_parameter'].sudo().get_param(DELTA_UPDATE_PARAM)
+        return bool(param) and param not in ('False', '0')
+
+    @api.model
+    def _get_manufacturing_cost_company(self):
+        """Company whose BOMs and rates the reconciled manufacturing costs follow"""
+        return self.env['res.company']._get_main_company()
+
+    def _alt_cost_changed(self, previous=None, pending=None):
+        if self.env.company != self._get_manufacturing_cost_company():
+            # Los costos de fabricación siguen a la compañía principal: los costos de
+            # otra compañía no los cambian, se desmarca lo que marcó el cambio
+            cost_fields = self._get_manufacturing_cost_fields()
+            if pending is None:
+                pending = {field: set(self.env.records_to_compute(field)._ids) for field in cost_fields}
+            super()._alt_cost_changed(previous, pending)
+            for field in cost_fields:
+                records = self.env.records_to_compute(field)
+                pending_ids = pending.get(field, ())
+                self.env.remove_to_compute(field, records.browse([
+                    record_id for record_id in records._ids if record_id not in pending_ids
+                ]))
+            return
+        if previous is None or not self._is_manufacturing_cost_delta_update():
+            super()._alt_cost_changed(previous, pending)
+            self._trigger_manufacturing_cost_recalc_for_dependents(self.ids)
+            return
+
+        fields_to_update = [
+            self._fields['manufacturing_alt_cost'],
+            self._fields['manufacturing_cost_state'],
+            self._fields['manufacturing_cost_message'],
+        ]
+        # Los ancestros pendientes de recálculo antes del cambio no tienen un valor
+        # base fiable; los marcados por la escritura de standard_price sí
+        if pending is None:
+            pending_ids = set(self.env.records_to_compute(fields_to_update[0])._ids)
+        else:
+            pending_ids = pending.get(fields_to_update[0], set())
+        self.invalidate_recordset(['alt_cost'])
+        plan = self._get_manufacturing_cost_delta_plan(previous, pending_ids)
+        super()._alt_cost_changed(previous, pending)
+
+        deltas = plan['deltas']
+        candidates = self.browse(list(deltas))
+        for field in fields_to_update:
+            # Ya actualizados por delta: que la cascada de modified() no los recalcule
+            self.env.remove_to_compute(field, candidates)
+        candidates._apply_manufacturing_cost_deltas(deltas)
+        self._trigger_manufacturing_cost_recalc_for_dependents(list(plan['full']), include=True)
+
+    def _get_manufacturing_cost_delta_plan(self, previous, pending=()):
+        """Split the ancestors of ``self`` between delta updates and full recomputes.
+
+        A purchased component whose cost moved by delta moves the cost of each
+        ancestor by delta x cumulative quantity. Components whose delta cannot
+        be trusted (new value, currency change, zero cost changing the state,
+        manufactured component), ancestors pending recomputation or not in
+        the ``ok`` state, and every ancestor above them, are recomputed in
+        full.
+
+        Ancestors built from components in another currency are recomputed
+        in full as well: a rate change moves the converted value of the whole
+        cost of these components, not only of their delta.
+
+        Quantities come from the where-used closure of the current company,
+        which follows the same main BOMs as the rollup. Ancestors only reached
+        through the BOMs of other companies, or whose main BOM is not the one
+        of ``_get_main_boms`` for this company, are recomputed in full too.
+
+        :param previous: dict {(product_id, company_id): (currency_id, alt_cost)}
+        :param pending: ids of the products pending recomputation before the change
+        :return: dict with 'deltas' {ancestor_id: delta} and 'full' (set of ids)
+        """
+        company = self.env.company
+        manufactured = self._get_main_boms()
+        component_deltas = {}
+        full_components = set()
+        for product in self:
+            old_currency_id, old_cost = previous.get((product.id, company.id), (None, None))
+            new_cost = product.alt_cost
+            if (product.id in manufactured or old_cost is None
+                    or (old_currency_id or False) != product.effective_alt_currency_id.id
+                    or old_cost <= 0 or new_cost <= 0):
+                full_components.add(product.id)
+            elif new_cost != old_cost:
+                component_deltas[product.id] = new_cost - old_cost
+
+        WhereUsed = self.env['almus.bom.where.used']
+        multipliers = WhereUsed._get_multipliers(self.ids, company.id)
+        ancestor_ids = {ancestor_id for _component_id, ancestor_id, _quantity in multipliers}
+        full = {ancestor_id for component_id, ancestor_id, _quantity in multipliers
+                if component_id in full_components}
+        full.update(ancestor_ids & set(pending))
+        # Solo los ancestros de la BOM principal de esta compañía admiten diferencias
+        full.update(set(WhereUsed._get_ancestors(self.ids)) - ancestor_ids)
+        full.update(ancestor_ids - set(self.browse(list(ancestor_ids))._get_main_boms()))
+        # Estado almacenado: leer el campo recalcularía los ancestros que el cambio ya marcó
+        self._cr.execute("""
+            SELECT id
+              FROM product_product
+             WHERE id = ANY(%s)
+               AND manufacturing_cost_state IS DISTINCT FROM 'ok'
+        """, (list(ancestor_ids - full),))
+        full.update(row[0] for row in self._cr.fetchall())
+        if full:
+            full.update(WhereUsed._get_ancestors(full))
+
+        # Con conversiones entre monedas la diferencia no basta (p. ej. cambio de tasa)
+        closure = WhereUsed._get_components(list(ancestor_ids - full), company.id)
+        products = self.browse(list({product_id for pair in closure for product_id in pair}))
+        currencies = {product.id: product.effective_alt_currency_id.id for product in products}
+        converted = {ancestor_id for ancestor_id, component_id in closure
+                     if currencies[component_id] != currencies[ancestor_id]}
+        if converted:
+            full |= converted
+            full.update(WhereUsed._get_ancestors(converted))
+
+        deltas = defaultdict(float)
+        for component_id, ancestor_id, quantity in multipliers:
+            if component_id not in component_deltas or ancestor_id in full:
+                continue
+            deltas[ancestor_id] += component_deltas[component_id] * quantity
+        return {'deltas': dict(deltas), 'full': full}
+
+    def _apply_manufacturing_cost_deltas(self, deltas):
+        """Add the deltas to the stored manufacturing costs in one bulk write.
+
+        Costs are rounded to the currency of each product; the drift with a
+        full rollup is reconciled by ``_cron_reconcile_manufacturing_costs``.
+        Only products in the ``ok`` state get deltas, so their state is kept
+        and their message stays empty.
+
+        :param deltas: dict {product_id: delta}
+        :return: recordset of the updated products
         """
-        Trigger recalculation using batch processing for better performance
+        rows = []
+        for product in self:
+            rounding = product.effective_alt_currency_id.rounding or 0.01
+            cost = float_round(product.manufacturing_alt_cost + deltas[product.id], precision_rounding=rounding)
+            if cost != product.manufacturing_alt_cost:
+                rows.append((product.id, cost))
+        if not rows:
+            return self.browse()
+        fnames = ['manufacturing_alt_cost', 'manufacturing_cost_message']
+        self.flush_recordset(fnames)
+        execute_values(self._cr, """
+            UPDATE product_product AS p
+               SET manufacturing_alt_cost = v.cost,
+                   manufacturing_cost_message = NULL
+              FROM (VALUES %s) AS v(id, cost)
+             WHERE p.id = v.id
+        """, rows, page_size=len(rows))
+        updated = self.browse([product_id for product_id, _cost in rows])
+        updated.invalidate_recordset(fnames)
+        # Solo las plantillas dependen directamente de estos valores
+        templates = updated.product_tmpl_id
+        for fname in ('manufacturing_alt_cost', 'manufacturing_cost_state'):
+            self.env.add_to_compute(templates._fields[fname], templates)
+        return updated
+
+    @api.model
+    def _get_manufactured_products(self):
+        """Every product, archived ones included, with an active BOM"""
+        self.env['mrp.bom'].flush_model(['active', 'product_id', 'product_tmpl_id'])
+        self._cr.execute("""
+            SELECT pp.id
+              FROM product_product pp
+             WHERE EXISTS (
+                   SELECT 1 FROM mrp_bom b
+                    WHERE b.active
+                      AND (b.product_id = pp.id
+                           OR (b.product_id IS NULL AND b.product_tmpl_id = pp.product_tmpl_id))
+                   )
+        """)
+        return self.with_context(active_test=False).browse([row[0] for row in self._cr.fetchall()])
+
+    @api.model
+    def _get_rollup_workers(self):
+        """Number of worker crons of the full rollup, 1 to compute in process.
+
+        Capped by the active worker crons and by the cron threads of the server.
         """
-        if not changed_product_ids:
-            return
-        
         try:
-            # Usar read_group para obtener todos los productos dependientes eficientemente
-            bom_line_data = self.env['mrp.bom.line'].read_group(
-                [('product_id', 'in', list(changed_product_ids))],
-                ['bom_id:array_agg'],
-                [],
-                lazy=False
-            )
-            
-            if not bom_line_data:
-                return
-            
-            # Extraer todos los BOM IDs
-            all_bom_ids = []
-            if bom_line_data and bom_line_data[0].get('bom_id'):
-                all_bom_ids = bom_line_data[0]['bom_id']
-            
-            if not all_bom_ids:
-                return
-            
-            # Obtener productos afectados de los BOMs
-            affected_products = self.env['mrp.bom'].browse(all_bom_ids).mapped(
-                lambda b: b.product_id or b.product_tmpl_id.product_variant_ids
-            )
-            
-            # Filtrar productos que no estaban en la lista original
-            products_to_update = affected_products.filtered(
-                lambda p: p.id not in changed_product_ids
-            )
-            
-            if products_to_update:
-                # Actualizar con contexto especial para evitar recursión infinita
-                products_to_update.with_context(
-                    cascade_update=True,
-                    no_commit=True  # Evitar commits intermedios
-                )._compute_manufacturing_alt_cost()
-                
-        except Exception as e:
-            _logger.error(
-                "Failed to trigger dependent recalculation for products %s: %s",
-                changed_product_ids, str(e),
-                exc_info=True
-            )
+            workers = int(self.env['ir.config_parameter'].sudo().get_param(ROLLUP_WORKERS_PARAM) or 1)
+        except ValueError:
+            workers = 1
+        crons = len(self.env['almus.alt.cost.job'].sudo()._get_worker_crons())
+        return max(1, min(workers, crons, config['max_cron_threads']))
 
-    def write(self, vals):
-        """Override write to trigger recalculation when alt_cost changes"""
-        # Guardar IDs antes de la escritura
-        if 'alt_cost' in vals and not self.env.context.get('cascade_update'):
-            products_changed = self.ids
-        else:
-            products_changed = []
-        
-        # Realizar escritura
-        result = super().write(vals)
-        
-        # Disparar recálculo si es necesario
-        if products_changed:
-            try:
-                self._trigger_manufacturing_cost_recalc_for_dependents(products_changed)
-            except Exception as e:
-                # No fallar la operación principal
-                _logger.error(
-                    "Failed to update dependent products after alt_cost change: %s",
-                    str(e)
-                )
-        
-        return result
+    def _get_rollup_partitions(self, count):
+        """Split ``self`` into at most ``count`` independent parts of the BOM graph.
+
+        Manufactured products linked through a sub-assembly, or sharing a
+        template, end up in the same connected component, so no part depends
+        on another nor updates the rows of another; purchased components are
+        leaves and may be shared. The components are spread over the parts
+        largest first, each one going to the smallest part.
+
+        :return: list of lists of product ids
+        """
+        main_boms, _bom_qty, bom_lines = self._get_bom_graph()
+        parent = {product_id: product_id for product_id in main_boms}
+
+        def find(product_id):
+            while parent[product_id] != product_id:
+                parent[product_id] = parent[parent[product_id]]
+                product_id = parent[product_id]
+            return product_id
+
+        for product_id, bom_id in main_boms.items():
+            for component_id, _qty in bom_lines[bom_id]:
+                if component_id in main_boms:
+                    parent[find(component_id)] = find(product_id)
+        variants = {}
+        for product in self.browse(list(main_boms)).read(['product_tmpl_id']):
+            template_id = product['product_tmpl_id'][0]
+            if template_id in variants:
+                parent[find(product['id'])] = find(variants[template_id])
+            else:
+                variants[template_id] = product['id']
+        requested = set(self.ids)
+        components = defaultdict(list)
+        for product_id in main_boms:
+            components[find(product_id)].append(product_id)
+
+        parts = [[] for _i in range(count)]
+        for members in sorted(components.values(), key=len, reverse=True):
+            if not requested.intersection(members):
+                continue
+            min(parts, key=len).extend(members)
+        return [part for part in parts if part]
+
+    def _write_manufacturing_costs(self, results):
+        """Persist rollup results in bulk, writing only the rows that changed.
+
+        One ``UPDATE ... FROM`` per batch compares the new values with the
+        stored ones, so unchanged rows are neither rewritten (no dead tuples,
+        no WAL) nor propagated to the templates. The cache is set without
+        marking the records dirty, so the ORM does not write them again when
+        called from the compute method.
+
+        :param results: dict {product_id: (cost, state, message)}
+        :return: number of products whose values changed
+        """
+        fnames = ['manufacturing_alt_cost', 'manufacturing_cost_state', 'manufacturing_cost_message']
+        rows = []
+        for product_id in self.ids:
+            cost, state, message = results[product_id]
+            rows.append((product_id, cost, state, message or None))
+        if not rows:
+            return 0
+        for fname in fnames:
+            self.env.remove_to_compute(self._fields[fname], self)
+        self.flush_recordset(fnames)
+        changed_ids = []
+        for batch in split_every(COST_WRITE_BATCH_SIZE, rows):
+            changed_ids += [row[0] for row in execute_values(self._cr, """
+                UPDATE product_product AS p
+                   SET manufacturing_alt_cost = v.cost,
+                       manufacturing_cost_state = v.state,
+                       manufacturing_cost_message = v.message
+                  FROM (VALUES %s) AS v(id, cost, state, message)
+                 WHERE p.id = v.id
+                   AND (p.manufacturing_alt_cost, p.manufacturing_cost_state, p.manufacturing_cost_message)
+                       IS DISTINCT FROM (v.cost, v.state, v.message)
+             RETURNING p.id
+            """, list(batch), template="(%s, %s::numeric, %s, %s::varchar)",
+                page_size=COST_WRITE_BATCH_SIZE, fetch=True)]
+        for index, fname in enumerate(fnames, start=1):
+            self.env.cache.update(self, self._fields[fname], [row[index] for row in rows])
+        # Solo las plantillas de los productos modificados dependen de estos valores
+        templates = self.browse(changed_ids).product_tmpl_id
+        for fname in ('manufacturing_alt_cost', 'manufacturing_cost_state'):
+            self.env.add_to_compute(templates._fields[fname], templates)
+        return len(changed_ids)
+
+    @api.model
+    def _cron_reconcile_manufacturing_costs(self):
+        """Full rollup of every manufactured product, fixing the delta rounding drift.
+
+        When the settings ask for several workers, the independent parts of
+        the BOM graph are queued as background jobs, each one processed by a
+        worker cron on its own cursor.
+
+        The costs are computed with the BOMs and rates of the company
+        returned by ``_get_manufacturing_cost_company``, the only one whose
+        alternative cost changes are then applied as deltas.
+
+        :return: number of products whose cost changed, None when queued
+        """
+        products = self.with_company(self._get_manufacturing_cost_company())._get_manufactured_products()
+        workers = self._get_rollup_workers()
+        partitions = products._get_rollup_partitions(workers) if workers > 1 else []
+        if len(partitions) > 1:
+            jobs = products.env['almus.alt.cost.job'].sudo()._enqueue_manufacturing_rollup(partitions)
+            _logger.info("Queued the manufacturing cost rollup of %s products in %s jobs",
+                         len(products), len(jobs))
+            return None
+        changed = products._write_manufacturing_costs(products._rollup_manufacturing_alt_costs())
+        _logger.info("Reconciled the manufacturing cost of %s products", changed)
+        return changed
+
+    @api.model
+    def _trigger_manufacturing_cost_recalc_for_dependents(self, changed_product_ids, include=False):
+        """Recompute the manufacturing cost of every product using the changed ones.
+
+        The where-used closure gives the whole transitive set of ancestors,
+        at every BOM level, in one query. They are marked for recomputation
+        together, so the ORM computes each of them once in a single rollup,
+        which orders them bottom-up.
+
+        :param include: also recompute the given products themselves
+        """
+        if not changed_product_ids:
+            return
+        ancestor_ids = set(self.env['almus.bom.where.used']._get_ancestors(changed_product_ids))
+        if include:
+            ancestor_ids.update(changed_product_ids)
+        if not ancestor_ids:
+            return
+        products = self.with_context(active_test=False).browse(list(ancestor_ids))
+        for fname in ('manufacturing_alt_cost', 'manufacturing_cost_state'):
+            self.env.add_to_compute(self._fields[fname], products)
 
     @api.model
     def clear_currency_cache(self):
-        """Limpiar caché de conversión de moneda (útil para tareas programadas)"""
-        self._get_currency_rate_cached.cache_clear()
-        _logger.info("Currency conversion cache cleared")
\ No newline at end of file
+        """Limpiar la matriz de tasas de la transacción (útil para tareas programadas)"""
+        self.env['almus.currency.rate.matrix']._invalidate()
+        _logger.info("Currency conversion cache cleared")
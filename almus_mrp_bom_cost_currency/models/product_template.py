@@ -10,7 +10,7 @@ class ProductTemplate(models.Model):
         string='Manufacturing Alt. Cost',
         compute='_compute_manufacturing_alt_cost',
         store=True,
-        currency_field='alt_currency_id',
+        currency_field='effective_alt_currency_id',
         help='Manufacturing cost calculated from BOM components alternative costs'
     )
     
@@ -19,6 +19,7 @@ class ProductTemplate(models.Model):
         ('warning', 'Warning'),
         ('no_bom', 'No BOM'),
         ('empty_bom', 'Empty BOM'),
+        ('error', 'Error'),
     ], string='Manufacturing Cost State', 
        compute='_compute_manufacturing_alt_cost', 
        store=True,
@@ -0,0 +1,14 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, models
+
+
+class ResCompany(models.Model):
+    _inherit = 'res.company'
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        companies = super().create(vals_list)
+        # El índice de dónde se usa tiene filas por compañía (BOMs compartidas)
+        self.env['almus.bom.where.used'].sudo()._rebuild()
+        return companies
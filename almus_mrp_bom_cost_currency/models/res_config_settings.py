@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models
+
+
+class ResConfigSettings(models.TransientModel):
+    _inherit = 'res.config.settings'
+
+    manufacturing_cost_delta_update = fields.Boolean(
+        string='Incremental Manufacturing Cost',
+        help='Apply component cost changes to the manufactured products as deltas '
+             'instead of exploding their BOMs again; a daily job reconciles the rounding',
+        config_parameter='almus_mrp_bom_cost_currency.delta_update'
+    )
+
+    manufacturing_cost_rollup_workers = fields.Integer(
+        string='Manufacturing Cost Rollup Workers',
+        default=1,
+        help='Background jobs used by the nightly full recompute of manufacturing costs; '
+             'independent parts of the BOM graph are computed in parallel by the job crons '
+             '(at most 4, and no more than the cron threads of the server)',
+        config_parameter='almus_mrp_bom_cost_currency.rollup_workers'
+    )
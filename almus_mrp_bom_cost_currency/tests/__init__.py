@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import test_where_used
+from . import test_manufacturing_cost_delta
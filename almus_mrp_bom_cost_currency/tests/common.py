@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+from odoo import Command
+from odoo.tests import TransactionCase
+
+from odoo.addons.almus_mrp_bom_cost_currency.models.almus_bom_where_used import WHERE_USED_DIRTY_KEY
+
+
+class BomCostCommon(TransactionCase):
+    """BOM graph shared by the where-used and manufacturing cost tests.
+
+    ``top`` is made from ``sub_b`` (x1) and ``sub_c`` (x2), both made from the
+    shared sub-assembly ``sub_d``, itself made from the purchased ``comp_e``::
+
+        top ─┬─ sub_b ─┬─ sub_d ── comp_e (x2)
+             │         └─ comp_f
+             └─ sub_c (x2) ── sub_d (x3)
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.company = cls.env.company
+        currency = cls.company.currency_id
+        Product = cls.env['product.product']
+        cls.comp_e = Product.create({'name': 'Component E', 'standard_price': 10.0, 'alt_currency_id': currency.id})
+        cls.comp_f = Product.create({'name': 'Component F', 'standard_price': 4.0, 'alt_currency_id': currency.id})
+        cls.sub_d = Product.create({'name': 'Sub-assembly D', 'alt_currency_id': currency.id})
+        cls.sub_b = Product.create({'name': 'Sub-assembly B', 'alt_currency_id': currency.id})
+        cls.sub_c = Product.create({'name': 'Sub-assembly C', 'alt_currency_id': currency.id})
+        cls.top = Product.create({'name': 'Top Product', 'alt_currency_id': currency.id})
+
+        cls.bom_d = cls._create_bom(cls.sub_d, [(cls.comp_e, 2.0)])
+        cls.bom_b = cls._create_bom(cls.sub_b, [(cls.sub_d, 1.0), (cls.comp_f, 1.0)])
+        cls.bom_c = cls._create_bom(cls.sub_c, [(cls.sub_d, 3.0)])
+        cls.bom_top = cls._create_bom(cls.top, [(cls.sub_b, 1.0), (cls.sub_c, 2.0)])
+        cls.products = cls.comp_e | cls.comp_f | cls.sub_d | cls.sub_b | cls.sub_c | cls.top
+        cls.manufactured = cls.sub_d | cls.sub_b | cls.sub_c | cls.top
+        cls.env.flush_all()
+
+    @classmethod
+    def _create_bom(cls, product, lines, **vals):
+        return cls.env['mrp.bom'].create(dict({
+            'product_tmpl_id': product.product_tmpl_id.id,
+            'product_qty': 1.0,
+            'sequence': 10,
+            'bom_line_ids': [
+                Command.create({'product_id': component.id, 'product_qty': quantity})
+                for component, quantity in lines
+            ],
+        }, **vals))
+
+    def setUp(self):
+        super().setUp()
+        # Cada prueba parte del índice completo, sin productos pendientes
+        self.env.cr.precommit.data.pop(WHERE_USED_DIRTY_KEY, None)
+        self.env['almus.bom.where.used']._rebuild()
+
+    def _get_closure(self):
+        """Where-used rows of the test products, comparable between rebuilds"""
+        self.env['almus.bom.where.used'].flush_model()
+        self.env.cr.execute("""
+            SELECT company_id, product_id, component_id, ROUND(quantity::numeric, 6), depth
+              FROM almus_bom_where_used
+             WHERE product_id = ANY(%s)
+          ORDER BY company_id, product_id, component_id
+        """, (self.products.ids,))
+        return self.env.cr.fetchall()
+
+    def _get_multipliers(self, component):
+        """{ancestor: cumulative quantity} of a component for the current company"""
+        return {
+            ancestor_id: quantity
+            for _component_id, ancestor_id, quantity
+            in self.env['almus.bom.where.used']._get_multipliers(component.ids, self.company.id)
+        }
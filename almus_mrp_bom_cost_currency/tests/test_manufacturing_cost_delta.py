@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+from unittest.mock import patch
+
+from odoo import Command, fields
+from odoo.tests import tagged
+
+from odoo.addons.almus_mrp_bom_cost_currency.models.product_product import DELTA_UPDATE_PARAM
+from odoo.addons.almus_product_cost_currency.models.product_product import DEFERRED_RECOMPUTE_PARAM
+from .common import BomCostCommon
+
+
+@tagged('post_install', '-at_install')
+class TestManufacturingCostDelta(BomCostCommon):
+    """Manufacturing costs updated by delta match a full rollup"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.env['ir.config_parameter'].sudo().set_param(DELTA_UPDATE_PARAM, 'True')
+        cls.other_currency = cls.env['res.currency'].create({
+            'name': 'ZZA',
+            'symbol': 'Z',
+            'rounding': 0.01,
+            'rate_ids': [Command.create({'name': '2020-01-01', 'rate': 2.0, 'company_id': False})],
+        })
+
+    def assertStoredMatchesRollup(self):
+        self.env.flush_all()
+        self.manufactured.invalidate_recordset()
+        expected = self.manufactured._rollup_manufacturing_alt_costs()
+        for product in self.manufactured:
+            cost, state, _message = expected[product.id]
+            self.assertEqual(
+                (product.manufacturing_alt_cost, product.manufacturing_cost_state), (cost, state),
+                product.display_name
+            )
+
+    def _get_pending(self):
+        """Test products waiting for a full recomputation of their manufacturing cost"""
+        return self.env.records_to_compute(self.top._fields['manufacturing_alt_cost']) & self.manufactured
+
+    def test_initial_costs(self):
+        self.assertEqual(self.sub_d.manufacturing_alt_cost, 20.0)
+        self.assertEqual(self.sub_b.manufacturing_alt_cost, 24.0)
+        self.assertEqual(self.sub_c.manufacturing_alt_cost, 60.0)
+        self.assertEqual(self.top.manufacturing_alt_cost, 144.0)
+        self.assertEqual(set(self.manufactured.mapped('manufacturing_cost_state')), {'ok'})
+
+    def test_delta_plan(self):
+        previous = {(self.comp_e.id, self.company.id): (self.company.currency_id.id, 8.0)}
+        plan = self.comp_e._get_manufacturing_cost_delta_plan(previous)
+        self.assertFalse(plan['full'])
+        self.assertEqual(plan['deltas'], {
+            self.sub_d.id: 4.0,
+            self.sub_b.id: 4.0,
+            self.sub_c.id: 12.0,
+            self.top.id: 28.0,
+        })
+
+    def test_delta_update_matches_full_rollup(self):
+        self.comp_e._write_alt_cost_values({self.comp_e.id: 12.5}, self.company)
+        # Updated by delta: nothing left for the full rollup
+        self.assertFalse(self._get_pending())
+        self.assertStoredMatchesRollup()
+        self.assertEqual(self.top.manufacturing_alt_cost, 179.0)
+
+    def test_standard_price_write_applies_deltas(self):
+        self.comp_e.standard_price = 12.5
+        # Sortable copy of the stored cost of the main company
+        self.assertEqual(self.comp_e.alt_cost_value, 12.5)
+        # The ancestors marked by the write itself are updated by delta
+        self.assertFalse(self._get_pending())
+        self.assertStoredMatchesRollup()
+        self.assertEqual(self.top.manufacturing_alt_cost, 179.0)
+
+    def test_deferred_standard_price_write_applies_deltas(self):
+        self.env['ir.config_parameter'].sudo().set_param(DEFERRED_RECOMPUTE_PARAM, 'True')
+        self.comp_e.standard_price = 12.5
+        self.assertFalse(self._get_pending())
+        Product = self.env.registry['product.product']
+        with patch.object(Product, '_rollup_manufacturing_alt_costs', autospec=True,
+                          side_effect=Product._rollup_manufacturing_alt_costs) as rollup:
+            self.env['product.product']._flush_deferred_alt_cost_recompute()
+        # No full recomputation overwrites the deltas
+        rollup.assert_not_called()
+        self.assertStoredMatchesRollup()
+        self.assertEqual(self.top.manufacturing_alt_cost, 179.0)
+
+    def test_other_company_standard_price_write(self):
+        company_2 = self.env['res.company'].create({'name': 'Delta Company 2'})
+        self.comp_e.with_company(company_2).standard_price = 99.0
+        # The stored costs follow the main company: nothing to recompute or change
+        self.assertFalse(self._get_pending())
+        self.assertStoredMatchesRollup()
+        self.assertEqual(self.top.manufacturing_alt_cost, 144.0)
+
+    def test_delta_update_after_bom_change(self):
+        self.bom_d.bom_line_ids.product_qty = 5.0
+        self.env.flush_all()
+        self.comp_e._write_alt_cost_values({self.comp_e.id: 12.0}, self.company)
+        self.assertFalse(self._get_pending())
+        self.assertStoredMatchesRollup()
+        self.assertEqual(self.top.manufacturing_alt_cost, 1.0 * 4.0 + 35.0 * 12.0)
+
+    def test_currency_conversion_plan(self):
+        self.comp_e.alt_currency_id = self.other_currency
+        self.env.flush_all()
+        previous = {(self.comp_e.id, self.company.id): (self.other_currency.id, self.comp_e.alt_cost / 2)}
+        plan = self.comp_e._get_manufacturing_cost_delta_plan(previous)
+        # Every ancestor converts comp_e to the company currency
+        self.assertEqual(plan['full'], set(self.manufactured.ids))
+        self.assertFalse(plan['deltas'])
+
+    def test_rate_change_matches_full_rollup(self):
+        self.comp_e.alt_currency_id = self.other_currency
+        self.env.flush_all()
+        self.assertStoredMatchesRollup()
+        alt_cost = self.comp_e.alt_cost
+        costs = {product.id: product.manufacturing_alt_cost for product in self.manufactured}
+
+        self.env['res.currency.rate'].create({
+            'name': fields.Date.today(),
+            'rate': 4.0,
+            'currency_id': self.other_currency.id,
+            'company_id': False,
+        })
+        # The refresh is queued: process the job chunks without the worker commits
+        job = self.env['almus.alt.cost.job'].search([
+            ('job_type', '=', 'rate_change'),
+            ('company_id', '=', self.company.id),
+            ('state', '=', 'pending'),
+        ])
+        self.assertEqual(job.currency_ids, self.other_currency)
+        while True:
+            products = job._get_next_chunk()
+            if not products:
+                break
+            job._process_chunk(products)
+            job.last_product_id = products[-1].id
+        self.comp_e.invalidate_recordset(['alt_cost'])
+        self.assertAlmostEqual(self.comp_e.alt_cost, alt_cost * 2, delta=0.01)
+        self.assertStoredMatchesRollup()
+        # Converted back to the company currency, the cost of comp_e did not move
+        for product in self.manufactured:
+            self.assertAlmostEqual(product.manufacturing_alt_cost, costs[product.id], delta=0.05)
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+from odoo import Command
+from odoo.tests import tagged
+
+from odoo.addons.almus_mrp_bom_cost_currency.models.almus_bom_where_used import WHERE_USED_DIRTY_KEY
+from .common import BomCostCommon
+
+
+@tagged('post_install', '-at_install')
+class TestBomWhereUsed(BomCostCommon):
+    """The incremental rebuild of the where-used closure matches a full rebuild"""
+
+    def assertIncrementalMatchesFull(self):
+        WhereUsed = self.env['almus.bom.where.used']
+        self.assertTrue(self.env.cr.precommit.data.get(WHERE_USED_DIRTY_KEY),
+                        "The change should mark products for reindexing")
+        WhereUsed._flush_dirty()
+        incremental = self._get_closure()
+        WhereUsed._rebuild()
+        self.assertEqual(incremental, self._get_closure())
+
+    def test_closure_quantities(self):
+        self.assertEqual(self._get_multipliers(self.comp_e), {
+            self.sub_d.id: 2.0,
+            self.sub_b.id: 2.0,
+            self.sub_c.id: 6.0,
+            # Through sub_b (1 x 2) and through sub_c (2 x 3 x 2)
+            self.top.id: 14.0,
+        })
+        depths = self.env['almus.bom.where.used']._get_ancestors(self.comp_e.ids, self.company.id)
+        self.assertEqual(depths[self.top.id], 3)
+
+    def test_add_bom_line(self):
+        self.bom_d.write({'bom_line_ids': [Command.create({'product_id': self.comp_f.id, 'product_qty': 4.0})]})
+        self.assertIncrementalMatchesFull()
+        # Directly through sub_b, then through sub_d under sub_b (1 x 4) and sub_c (2 x 3 x 4)
+        self.assertEqual(self._get_multipliers(self.comp_f)[self.top.id], 29.0)
+
+    def test_remove_bom_line(self):
+        self.bom_b.bom_line_ids.filtered(lambda line: line.product_id == self.sub_d).unlink()
+        self.assertIncrementalMatchesFull()
+        self.assertEqual(self._get_multipliers(self.comp_e)[self.top.id], 12.0)
+        self.assertNotIn(self.sub_b.id, self._get_multipliers(self.comp_e))
+
+    def test_shared_sub_assembly_quantity(self):
+        self.bom_d.bom_line_ids.product_qty = 5.0
+        self.assertIncrementalMatchesFull()
+        self.assertEqual(self._get_multipliers(self.comp_e)[self.top.id], 35.0)
+
+    def test_bom_company(self):
+        company_2 = self.env['res.company'].create({'name': 'Where-Used Company 2'})
+        self.env.cr.precommit.data.pop(WHERE_USED_DIRTY_KEY, None)
+        self.bom_c.company_id = company_2
+        self.assertIncrementalMatchesFull()
+        # sub_c is no longer manufactured with the BOMs of this company
+        self.assertEqual(self._get_multipliers(self.comp_e), {self.sub_d.id: 2.0, self.sub_b.id: 2.0, self.top.id: 2.0})
+        # Only the BOM of sub_c is used by the other company
+        multipliers = self.env['almus.bom.where.used']._get_multipliers(self.sub_d.ids, company_2.id)
+        self.assertEqual(multipliers, [(self.sub_d.id, self.sub_c.id, 3.0)])
+
+    def test_bom_sequence(self):
+        bom_c_2 = self._create_bom(self.sub_c, [(self.comp_f, 5.0)], sequence=20)
+        self.assertIncrementalMatchesFull()
+        self.assertNotIn(self.sub_c.id, self._get_multipliers(self.comp_f))
+
+        (self.bom_c | bom_c_2).write({'sequence': 30})
+        bom_c_2.sequence = 5
+        self.assertIncrementalMatchesFull()
+        self.assertEqual(self._get_multipliers(self.comp_f)[self.sub_c.id], 5.0)
+        # The stored main BOM follows the same precedence as the closure
+        self.assertEqual(self.sub_c._get_main_bom(), bom_c_2)
+        self.assertNotIn(self.sub_c.id, self._get_multipliers(self.comp_e))
+
+    def test_move_variant(self):
+        Product = self.env['product.product']
+        variant = Product.create({'name': 'Moved Variant'})
+        other = Product.create({'name': 'Other Template'})
+        user = Product.create({'name': 'Variant User'})
+        self.products |= variant | other | user
+        self._create_bom(variant, [(self.comp_e, 1.0)])
+        self._create_bom(other, [(self.comp_f, 1.0)])
+        self._create_bom(user, [(variant, 3.0)])
+        self.env['almus.bom.where.used']._flush_dirty()
+
+        # La variante propia de la plantilla destino se archiva (combinación única)
+        target = other.product_tmpl_id
+        other.active = False
+        variant.product_tmpl_id = target
+        self.assertIncrementalMatchesFull()
+        self.assertEqual(self._get_multipliers(self.comp_f)[user.id], 3.0)
+        self.assertNotIn(user.id, self._get_multipliers(self.comp_e))
+
+    def test_bom_cycle(self):
+        # comp_e pasa a fabricarse con el producto final
+        self._create_bom(self.comp_e, [(self.top, 1.0)])
+        self.assertIncrementalMatchesFull()
+        # Los miembros del ciclo no se expanden entre sí
+        self.assertEqual(self._get_multipliers(self.top), {self.comp_e.id: 1.0})
+
+        self.comp_e.bom_ids.unlink()
+        self.assertIncrementalMatchesFull()
+        self.assertEqual(self._get_multipliers(self.top), {})
+        self.assertFalse(self.comp_e.has_bom())
@@ -0,0 +1,177 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models, _
+from odoo.exceptions import UserError, ValidationError
+
+
+class AlmusManufacturingCostSimulation(models.TransientModel):
+    _name = 'almus.manufacturing.cost.simulation'
+    _description = 'Manufacturing Cost What-If Simulation'
+
+    product_ids = fields.Many2many(
+        'product.product',
+        string='Products',
+        help='Manufactured products to simulate, all of them if empty'
+    )
+
+    categ_ids = fields.Many2many(
+        'product.category',
+        string='Product Categories',
+        help='Only simulate products of these categories (and their subcategories)'
+    )
+
+    scenario_ids = fields.One2many(
+        'almus.manufacturing.cost.simulation.scenario',
+        'simulation_id',
+        string='Scenarios'
+    )
+
+    result_ids = fields.One2many(
+        'almus.manufacturing.cost.simulation.result',
+        'simulation_id',
+        string='Results',
+        readonly=True
+    )
+
+    def _get_products(self):
+        """Manufactured products to simulate"""
+        self.ensure_one()
+        if self.product_ids:
+            products = self.product_ids
+        else:
+            domain = [('product_tmpl_id.bom_ids', '!=', False)]
+            if self.categ_ids:
+                domain.append(('categ_id', 'child_of', self.categ_ids.ids))
+            products = self.env['product.product'].search(domain)
+        # BOMs principales de la compañía que sigue la simulación
+        main_boms = products.with_company(products._get_manufacturing_cost_company())._get_main_boms()
+        return products.filtered(lambda product: product.id in main_boms)
+
+    def action_simulate(self):
+        """Evaluate every scenario at once and display the simulated costs"""
+        self.ensure_one()
+        if not self.scenario_ids:
+            raise UserError(_('Add at least one scenario to simulate.'))
+        products = self._get_products()
+        if not products:
+            raise UserError(_('No manufactured products found to simulate.'))
+
+        results = products._simulate_manufacturing_alt_costs([
+            scenario._get_scenario_values() for scenario in self.scenario_ids
+        ])
+        self.result_ids.unlink()
+        vals_list = []
+        for scenario, scenario_results in zip(self.scenario_ids, results):
+            for product in products:
+                cost, delta = scenario_results[product.id]
+                vals_list.append({
+                    'simulation_id': self.id,
+                    'scenario_id': scenario.id,
+                    'product_id': product.id,
+                    'current_cost': cost - delta,
+                    'simulated_cost': cost,
+                    'delta': delta,
+                })
+        self.env['almus.manufacturing.cost.simulation.result'].create(vals_list)
+
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Simulated Manufacturing Costs'),
+            'res_model': 'almus.manufacturing.cost.simulation.result',
+            'view_mode': 'tree,pivot',
+            'domain': [('simulation_id', '=', self.id)],
+            'context': {'group_by': 'scenario_id'},
+        }
+
+
+class AlmusManufacturingCostSimulationScenario(models.TransientModel):
+    _name = 'almus.manufacturing.cost.simulation.scenario'
+    _description = 'Manufacturing Cost Simulation Scenario'
+
+    simulation_id = fields.Many2one(
+        'almus.manufacturing.cost.simulation',
+        required=True,
+        ondelete='cascade'
+    )
+
+    name = fields.Char(
+        string='Scenario',
+        required=True
+    )
+
+    currency_id = fields.Many2one(
+        'res.currency',
+        string='Currency',
+        help='Currency whose exchange rate is simulated'
+    )
+
+    rate = fields.Float(
+        string='Rate',
+        digits=0,
+        help='Hypothetical rate of the currency against the company currency'
+    )
+
+    price_change = fields.Float(
+        string='Component Price Change (%)',
+        help='Percentage applied to the cost of every purchased component'
+    )
+
+    @api.constrains('currency_id', 'rate')
+    def _check_rate(self):
+        for scenario in self:
+            if scenario.currency_id and scenario.rate <= 0:
+                raise ValidationError(_('The simulated rate of scenario %s must be positive.', scenario.name))
+
+    def _get_scenario_values(self):
+        """Scenario in the format of ``product.product._simulate_manufacturing_alt_costs``"""
+        self.ensure_one()
+        values = {'price_factor': 1.0 + self.price_change / 100.0}
+        if self.currency_id:
+            values['rates'] = {self.currency_id.id: self.rate}
+        return values
+
+
+class AlmusManufacturingCostSimulationResult(models.TransientModel):
+    _name = 'almus.manufacturing.cost.simulation.result'
+    _description = 'Manufacturing Cost Simulation Result'
+    _order = 'scenario_id, product_id'
+
+    simulation_id = fields.Many2one(
+        'almus.manufacturing.cost.simulation',
+        required=True,
+        ondelete='cascade'
+    )
+
+    scenario_id = fields.Many2one(
+        'almus.manufacturing.cost.simulation.scenario',
+        string='Scenario',
+        required=True,
+        ondelete='cascade'
+    )
+
+    product_id = fields.Many2one(
+        'product.product',
+        string='Product',
+        required=True,
+        ondelete='cascade'
+    )
+
+    currency_id = fields.Many2one(
+        related='product_id.effective_alt_currency_id',
+        string='Currency'
+    )
+
+    current_cost = fields.Monetary(
+        string='Current Cost',
+        currency_field='currency_id'
+    )
+
+    simulated_cost = fields.Monetary(
+        string='Simulated Cost',
+        currency_field='currency_id'
+    )
+
+    delta = fields.Monetary(
+        string='Difference',
+        currency_field='currency_id'
+    )
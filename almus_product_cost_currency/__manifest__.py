@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Product Cost in Alternative Currency',
-    'version': '17.0.1.2.0',
+    'version': '17.0.1.9.0',
     'category': 'Inventory/Inventory',
     'summary': 'Display product cost in alternative currency and use it in pricelists',
     'description': """
@@ -34,6 +34,8 @@
     ],
     'data': [
         'security/ir.model.access.csv',
+        'data/ir_cron_data.xml',
+        'views/almus_alt_cost_job_views.xml',
         'wizard/cost_recalculation_wizard_views.xml',
         'views/res_config_settings_views.xml',
         'views/product_views.xml',
@@ -0,0 +1,232 @@
+# -*- coding: utf-8 -*-
+"""Benchmarks of the alternative cost hot paths.
+
+Generates a synthetic catalogue (variants shared by several companies with
+different currencies, a year of rate history) and measures, for each
+catalogue size, the wall time and the number of SQL queries of:
+
+- reading ``alt_cost`` (``_compute_alt_cost``)
+- the settings currency change, in both processing modes of the job
+  (ORM chunks and SQL bulk)
+- ``action_recalculate_alt_costs``
+- a large pricelist evaluation with ``base='alt_cost'``
+
+Run it from an Odoo shell on a disposable database with the module
+installed::
+
+    $ odoo-bin shell -d alt_cost_bench --no-http
+    >>> from odoo.addons.almus_product_cost_currency.benchmarks import benchmark_alt_cost
+    >>> benchmark_alt_cost.run(env, sizes=(10000, 100000, 500000), output='/tmp/alt_cost_bench.json')
+
+Every catalogue is generated in a transaction rolled back afterwards, the
+results are written as JSON.
+"""
+
+from datetime import timedelta
+import json
+import logging
+import platform
+import random
+import time
+
+from psycopg2.extras import execute_values
+
+from odoo import fields
+from odoo.tools import split_every
+
+_logger = logging.getLogger(__name__)
+
+DEFAULT_SIZES = (10000, 100000, 500000)
+COMPANY_CURRENCIES = ('USD', 'EUR', 'VES')
+ALT_CURRENCY = 'USD'
+RATE_HISTORY_DAYS = 365
+CREATE_BATCH_SIZE = 1000
+ORDER_LINES = 1000
+SEED = 42
+
+
+class _Measure:
+    """Context manager timing a block and counting its SQL queries"""
+
+    def __init__(self, env, results, name, size):
+        self.env = env
+        self.results = results
+        self.name = name
+        self.size = size
+
+    def __enter__(self):
+        self.env.flush_all()
+        self.env.invalidate_all()
+        self.queries = self.env.cr.sql_log_count
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type:
+            return False
+        self.env.flush_all()
+        duration = time.perf_counter() - self.start
+        queries = self.env.cr.sql_log_count - self.queries
+        self.results.append({
+            'benchmark': self.name,
+            'size': self.size,
+            'seconds': round(duration, 3),
+            'queries': queries,
+        })
+        _logger.info("%s [%s products]: %.3fs, %s queries", self.name, self.size, duration, queries)
+        return False
+
+
+def _get_currencies(env):
+    currencies = env['res.currency'].with_context(active_test=False).search([
+        ('name', 'in', COMPANY_CURRENCIES),
+    ])
+    currencies.write({'active': True})
+    return {currency.name: currency for currency in currencies}
+
+
+def _create_companies(env, currencies):
+    return env['res.company'].create([
+        {'name': 'Alt Cost Bench %s' % name, 'currency_id': currencies[name].id}
+        for name in COMPANY_CURRENCIES
+    ])
+
+
+def _create_rate_history(env, currencies, companies):
+    today = fields.Date.today()
+    rng = random.Random(SEED)
+    vals_list = []
+    for currency in currencies.values():
+        for company in companies:
+            rate = rng.uniform(0.5, 40.0)
+            for day in range(RATE_HISTORY_DAYS):
+                rate *= rng.uniform(0.99, 1.01)
+                vals_list.append({
+                    'currency_id': currency.id,
+                    'company_id': company.id,
+                    'name': today - timedelta(days=day),
+                    'rate': rate,
+                })
+    env['res.currency.rate'].create(vals_list)
+
+
+def _create_products(env, size, companies):
+    """Create ``size`` shared variants and their company-dependent costs.
+
+    The standard prices are inserted straight into ``ir_property``: going
+    through the ORM would benchmark the setup instead of the hot paths.
+    """
+    rng = random.Random(SEED)
+    field = env['ir.model.fields']._get('product.product', 'standard_price')
+    templates = env['product.template']
+    for batch in split_every(CREATE_BATCH_SIZE, range(size)):
+        templates |= env['product.template'].with_context(tracking_disable=True).create([
+            {'name': 'Alt Cost Bench %s' % index, 'type': 'product'}
+            for index in batch
+        ])
+    products = templates.product_variant_ids
+    rows = [
+        ('standard_price', 'float', field.id, company.id, 'product.product,%s' % product_id,
+         round(rng.uniform(1.0, 1000.0), 2))
+        for company in companies
+        for product_id in products.ids
+    ]
+    for batch in split_every(CREATE_BATCH_SIZE * 10, rows):
+        execute_values(env.cr, """
+            INSERT INTO ir_property (name, type, fields_id, company_id, res_id, value_float)
+            VALUES %s
+        """, list(batch))
+    env.invalidate_all()
+    return products
+
+
+def _create_pricelist(env, currency):
+    return env['product.pricelist'].create({
+        'name': 'Alt Cost Bench',
+        'currency_id': currency.id,
+        'item_ids': [(0, 0, {
+            'applied_on': '3_global',
+            'compute_price': 'formula',
+            'base': 'alt_cost',
+            'price_discount': -30,
+        })],
+    })
+
+
+def _run_size(env, size, companies, currencies, results):
+    Product = env['product.product']
+    products = _create_products(env, size, companies)
+    sample = products[:ORDER_LINES]
+
+    for company in companies:
+        with _Measure(env, results, 'recompute_store_orm[%s]' % company.currency_id.name, size):
+            products._recompute_alt_cost_bulk(company)
+
+    with _Measure(env, results, 'compute_alt_cost_read', size):
+        products.mapped('alt_cost')
+
+    with _Measure(env, results, 'compute_alt_cost_read_sample', len(sample)):
+        sample.mapped('alt_cost')
+
+    # Settings currency change, in both processing modes of the job
+    env['ir.config_parameter'].sudo().set_param(
+        'almus_product_cost_currency.alt_currency_id', currencies['EUR'].id
+    )
+    with _Measure(env, results, 'update_alt_currency_orm', size):
+        for chunk in split_every(CREATE_BATCH_SIZE, products.ids):
+            Product.browse(chunk)._recompute_alt_cost_bulk()
+    env['ir.config_parameter'].sudo().set_param(
+        'almus_product_cost_currency.alt_currency_id', currencies[ALT_CURRENCY].id
+    )
+    with _Measure(env, results, 'update_alt_currency_sql', size):
+        for chunk in split_every(CREATE_BATCH_SIZE, products.ids):
+            Product.browse(chunk)._refresh_alt_cost_sql()
+
+    with _Measure(env, results, 'action_recalculate_alt_costs', size):
+        Product.action_recalculate_alt_costs()
+
+    pricelist = _create_pricelist(env, companies[0].currency_id)
+    with _Measure(env, results, 'pricelist_alt_cost_order', len(sample)):
+        pricelist._compute_price_rule(sample, 1.0)
+
+    with _Measure(env, results, 'pricelist_alt_cost_order_past_date', len(sample)):
+        pricelist._compute_price_rule(sample, 1.0, date=fields.Date.today() - timedelta(days=30))
+
+    with _Measure(env, results, 'snapshot_alt_costs', size):
+        env['almus.product.alt.cost.history']._cron_snapshot_alt_costs()
+
+
+def run(env, sizes=DEFAULT_SIZES, output='alt_cost_benchmark.json'):
+    """Run the benchmarks and write the results to ``output`` (JSON).
+
+    Each size runs on its own synthetic catalogue, in a transaction that is
+    rolled back afterwards.
+
+    :return: list of result dicts
+    """
+    results = []
+    env = env(su=True)
+    for size in sizes:
+        try:
+            currencies = _get_currencies(env)
+            companies = _create_companies(env, currencies)
+            _create_rate_history(env, currencies, companies)
+            env['ir.config_parameter'].set_param(
+                'almus_product_cost_currency.alt_currency_id', currencies[ALT_CURRENCY].id
+            )
+            _run_size(env, size, companies, currencies, results)
+        finally:
+            env.cr.rollback()
+            env.invalidate_all()
+            env.registry.clear_cache()
+
+    report = {
+        'date': fields.Datetime.to_string(fields.Datetime.now()),
+        'database': env.cr.dbname,
+        'python': platform.python_version(),
+        'results': results,
+    }
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+    _logger.info("Alternative cost benchmark results written to %s", output)
+    return results
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Los productos que guardaban la moneda global pasan a heredarla (NULL)"""
+    cr.execute(
+        "SELECT value FROM ir_config_parameter WHERE key = %s",
+        ('almus_product_cost_currency.alt_currency_id',)
+    )
+    row = cr.fetchone()
+    if not row or not row[0] or not row[0].isdigit():
+        return
+    cr.execute(
+        "UPDATE product_product SET alt_currency_id = NULL WHERE alt_currency_id = %s",
+        (int(row[0]),)
+    )
+    _logger.info("%s products now inherit the alternative currency from settings", cr.rowcount)
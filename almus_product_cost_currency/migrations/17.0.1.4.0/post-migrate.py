@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """El costo alternativo pasa a guardarse por compañía en almus_product_alt_cost.
+
+    La columna global se elimina (su valor dependía de la compañía del usuario
+    que disparó el cálculo) y se encola un recálculo completo; mientras tanto
+    el costo se convierte al vuelo al leerlo.
+    """
+    cr.execute("ALTER TABLE product_product DROP COLUMN IF EXISTS alt_cost")
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['almus.alt.cost.job']._enqueue({
+        'name': 'Fill the per-company alternative cost store',
+        'job_type': 'recalculate',
+    })
+    _logger.info("Queued the recalculation of the per-company alternative costs")
@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Llenar los agregados de costo alternativo almacenados en las plantillas"""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cr.execute("SELECT id FROM product_template ORDER BY id")
+    template_ids = [row[0] for row in cr.fetchall()]
+    updated = env['product.template'].browse(template_ids)._refresh_alt_cost_aggregates()
+    _logger.info("Filled the alternative cost aggregates of %s templates", updated)
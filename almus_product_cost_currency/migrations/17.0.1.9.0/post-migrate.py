@@ -0,0 +1,16 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import api, SUPERUSER_ID
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    """Llenar el costo alternativo almacenado en las variantes"""
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cr.execute("SELECT id FROM product_product ORDER BY id")
+    product_ids = [row[0] for row in cr.fetchall()]
+    updated = env['product.product'].browse(product_ids)._refresh_alt_cost_value()
+    _logger.info("Filled the stored alternative cost of %s variants", updated)
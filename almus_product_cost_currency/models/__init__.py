@@ -3,4 +3,9 @@
 from . import product_product
 from . import product_template
 from . import res_config_settings
-from . import product_pricelist_item
\ No newline at end of file
+from . import product_pricelist_item
+from . import res_currency_rate
+from . import almus_alt_cost_job
+from . import product_pricelist
+from . import almus_product_alt_cost
+from . import almus_product_alt_cost_history
@@ -0,0 +1,406 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models, Command, _
+from odoo.exceptions import UserError
+from odoo.tools.safe_eval import safe_eval
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Productos procesados (y confirmados) por bloque
+JOB_CHUNK_SIZE = 1000
+# A partir de este número de productos se usa el modo SQL masivo
+BULK_MODE_THRESHOLD = 5000
+
+
+class AlmusAltCostJob(models.Model):
+    _name = 'almus.alt.cost.job'
+    _description = 'Alternative Cost Background Job'
+    _order = 'id desc'
+
+    name = fields.Char(
+        string='Description',
+        required=True
+    )
+
+    job_type = fields.Selection([
+        ('currency_change', 'Alternative Currency Change'),
+        ('recalculate', 'Alternative Cost Recalculation'),
+        ('rate_change', 'Currency Rate Change'),
+    ], string='Job Type', required=True, default='currency_change')
+
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+        ('cancelled', 'Cancelled'),
+    ], string='State', required=True, default='pending', index=True)
+
+    currency_id = fields.Many2one(
+        'res.currency',
+        string='Currency',
+        help='Alternative currency configured when the job was queued'
+    )
+
+    currency_ids = fields.Many2many(
+        'res.currency',
+        string='Changed Currencies',
+        readonly=True,
+        help='Currencies whose rates changed: only the products converting from or to them are recomputed'
+    )
+
+    domain = fields.Char(
+        string='Product Filter',
+        default='[]',
+        readonly=True,
+        help='Additional domain restricting the products of the job'
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        readonly=True,
+        help='Only recompute the alternative cost of this company (all companies if empty)'
+    )
+
+    bulk_mode = fields.Boolean(
+        string='Bulk Mode',
+        readonly=True,
+        help='Chunks are recomputed with a single SQL statement instead of the ORM'
+    )
+
+    last_product_id = fields.Integer(
+        string='Last Processed Product',
+        readonly=True,
+        help='Watermark: ID of the last product of the last committed chunk. '
+             'The job resumes after this product.'
+    )
+
+    total_count = fields.Integer(
+        string='Products to Process',
+        readonly=True
+    )
+
+    processed_count = fields.Integer(
+        string='Processed Products',
+        readonly=True
+    )
+
+    updated_count = fields.Integer(
+        string='Updated Costs',
+        readonly=True,
+        help='Number of stored alternative costs that actually changed'
+    )
+
+    progress = fields.Float(
+        string='Progress',
+        compute='_compute_progress',
+        help='Percentage of processed products'
+    )
+
+    throughput = fields.Float(
+        string='Throughput (products/s)',
+        compute='_compute_throughput',
+        digits=(16, 1)
+    )
+
+    time_remaining = fields.Float(
+        string='Estimated Time Left',
+        compute='_compute_throughput',
+        help='Estimated time to finish the job, in hours'
+    )
+
+    date_start = fields.Datetime(
+        string='Started On',
+        readonly=True
+    )
+
+    date_end = fields.Datetime(
+        string='Finished On',
+        readonly=True
+    )
+
+    cancel_requested = fields.Boolean(
+        string='Cancellation Requested',
+        readonly=True,
+        help='The worker stops after its current chunk. Running jobs are never cancelled '
+             'directly: the worker updates the job after every chunk.'
+    )
+
+    error_message = fields.Text(
+        string='Error',
+        readonly=True
+    )
+
+    @api.depends('total_count', 'processed_count', 'state')
+    def _compute_progress(self):
+        for job in self:
+            if job.state == 'done':
+                job.progress = 100.0
+            elif job.total_count:
+                job.progress = min(100.0, 100.0 * job.processed_count / job.total_count)
+            else:
+                job.progress = 0.0
+
+    @api.depends('processed_count', 'total_count', 'date_start', 'date_end', 'state')
+    def _compute_throughput(self):
+        now = fields.Datetime.now()
+        for job in self:
+            elapsed = 0.0
+            if job.date_start:
+                elapsed = ((job.date_end or now) - job.date_start).total_seconds()
+            if elapsed > 0 and job.processed_count:
+                job.throughput = job.processed_count / elapsed
+            else:
+                job.throughput = 0.0
+            if job.state in ('pending', 'running') and job.throughput:
+                remaining = max(job.total_count - job.processed_count, 0)
+                job.time_remaining = remaining / job.throughput / 3600.0
+            else:
+                job.time_remaining = 0.0
+
+    @api.model
+    def _enqueue(self, vals):
+        """Create a job and wake up the worker cron.
+
+        A new job supersedes the unfinished jobs of the same type on the same
+        products and company.
+        """
+        job_type = vals.get('job_type', 'currency_change')
+        self.search([
+            ('job_type', '=', job_type),
+            ('domain', '=', vals.get('domain', '[]')),
+            ('company_id', '=', vals.get('company_id', False)),
+            ('state', 'in', ('pending', 'running')),
+        ])._request_cancel()
+        job = self.create(vals)
+        self.env.ref('almus_product_cost_currency.ir_cron_process_alt_cost_jobs')._trigger()
+        return job
+
+    @api.model
+    def _enqueue_rate_change(self, companies, currencies):
+        """Queue one rate change job per company.
+
+        The new job of a company supersedes its unfinished rate change jobs,
+        so it also covers their currencies.
+
+        :return: the queued jobs
+        """
+        jobs = self.browse()
+        for company in companies:
+            unfinished = self.search([
+                ('job_type', '=', 'rate_change'),
+                ('company_id', '=', company.id),
+                ('state', 'in', ('pending', 'running')),
+            ])
+            job_currencies = currencies | unfinished.currency_ids
+            jobs |= self._enqueue({
+                'name': _('Rate change on %(currencies)s (%(company)s)',
+                          currencies=', '.join(job_currencies.mapped('name')), company=company.name),
+                'job_type': 'rate_change',
+                'company_id': company.id,
+                'currency_ids': [Command.set(job_currencies.ids)],
+            })
+        return jobs
+
+    def _request_cancel(self):
+        """Cancel pending jobs, ask the worker to stop the running ones.
+
+        The row of a running job is updated by the worker after every chunk;
+        changing its state concurrently would make the worker's next update
+        fail with a serialization error. The flag is read by the worker
+        after each commit instead.
+        """
+        self.filtered(lambda j: j.state == 'pending').write({
+            'state': 'cancelled',
+            'date_end': fields.Datetime.now(),
+        })
+        self.filtered(lambda j: j.state == 'running').write({'cancel_requested': True})
+
+    def _stop_if_cancel_requested(self):
+        """Mark the job cancelled if asked to, from a fresh read of the row
+
+        :return: True when the job must stop
+        """
+        self.ensure_one()
+        self.invalidate_recordset(['state', 'cancel_requested'])
+        if self.state != 'running':
+            return True
+        if not self.cancel_requested:
+            return False
+        self.write({'state': 'cancelled', 'date_end': fields.Datetime.now()})
+        self.env.cr.commit()
+        _logger.info("Alternative cost job %s cancelled after product ID %s", self.id, self.last_product_id)
+        return True
+
+    def _get_product_domain(self):
+        self.ensure_one()
+        if self.job_type == 'currency_change':
+            # Only the products inheriting the alternative currency from settings
+            domain = [('alt_currency_id', '=', False)]
+        elif self.job_type == 'rate_change' and self.company_id.currency_id not in self.currency_ids:
+            # Only the products converting to one of the changed currencies
+            domain = [('effective_alt_currency_id', 'in', self.currency_ids.ids)]
+        else:
+            domain = [('effective_alt_currency_id', '!=', False)]
+        if self.company_id:
+            domain += ['|', ('company_id', '=', False), ('company_id', '=', self.company_id.id)]
+        return domain + safe_eval(self.domain or '[]')
+
+    def _get_next_chunk(self):
+        """Products following the watermark, in id order, archived ones included"""
+        self.ensure_one()
+        return self.env['product.product'].with_context(active_test=False).search(
+            self._get_product_domain() + [('id', '>', self.last_product_id)],
+            order='id',
+            limit=JOB_CHUNK_SIZE
+        )
+
+    def _process_chunk(self, products):
+        """Apply the job on a chunk of products
+
+        :return: number of stored alternative costs that changed
+        """
+        self.ensure_one()
+        companies = self.company_id or None
+        if self.bulk_mode:
+            return products._refresh_alt_cost_sql(companies)
+        return products._recompute_alt_cost_bulk(companies)
+
+    def _get_chunk_processor(self):
+        """Prepare the processing of the chunks, once per run of the job
+
+        :return: function(products) returning the number of stored alternative costs that changed
+        """
+        self.ensure_one()
+        return self._process_chunk
+
+    def _run(self):
+        """Process the job chunk by chunk, committing after each chunk.
+
+        Called from the worker cron only: the intermediate commits are what
+        make the job resumable from its watermark after a restart.
+        """
+        self.ensure_one()
+        if self.state == 'pending':
+            total_count = self.env['product.product'].with_context(active_test=False).search_count(
+                self._get_product_domain()
+            )
+            try:
+                self.write({
+                    'state': 'running',
+                    'date_start': fields.Datetime.now(),
+                    'total_count': total_count,
+                    'bulk_mode': total_count > BULK_MODE_THRESHOLD,
+                })
+                self.env.cr.commit()
+            except Exception:
+                # Cancelado mientras arrancaba
+                self.env.cr.rollback()
+                self.invalidate_recordset()
+                if self.state != 'pending':
+                    return False
+                raise
+
+        _logger.info(
+            "Running alternative cost job %s (%s) from product ID %s",
+            self.id, self.job_type, self.last_product_id
+        )
+        process_chunk = None
+        while True:
+            # Lectura tras cada commit: la cancelación no toca el estado del trabajo en curso
+            if self._stop_if_cancel_requested():
+                return False
+            products = self._get_next_chunk()
+            if not products:
+                break
+            try:
+                if process_chunk is None:
+                    process_chunk = self._get_chunk_processor()
+                updated = process_chunk(products)
+                self.write({
+                    'last_product_id': products[-1].id,
+                    'processed_count': self.processed_count + len(products),
+                    'updated_count': self.updated_count + updated,
+                })
+                self.env.cr.commit()
+            except Exception as e:
+                self.env.cr.rollback()
+                # Conflicto con una solicitud de cancelación: no es un fallo
+                if self._stop_if_cancel_requested():
+                    return False
+                _logger.error(
+                    "Alternative cost job %s failed after product ID %s: %s",
+                    self.id, self.last_product_id, str(e),
+                    exc_info=True
+                )
+                self.write({
+                    'state': 'failed',
+                    'error_message': str(e),
+                    'date_end': fields.Datetime.now(),
+                })
+                self.env.cr.commit()
+                return False
+            # Keep the worker memory bounded between chunks
+            self.env.invalidate_all()
+
+        self.write({'state': 'done', 'date_end': fields.Datetime.now()})
+        self.env.cr.commit()
+        _logger.info("Alternative cost job %s finished: %s products", self.id, self.processed_count)
+        return True
+
+    def _try_lock(self):
+        """Take the session advisory lock of the job, without waiting.
+
+        The lock survives the commits of ``_run`` and is released by
+        ``_unlock`` or when the connection of the worker is closed.
+        """
+        self.ensure_one()
+        self.env.cr.execute(
+            "SELECT pg_try_advisory_lock('almus_alt_cost_job'::regclass::integer, %s)", [self.id]
+        )
+        return self.env.cr.fetchone()[0]
+
+    def _unlock(self):
+        self.ensure_one()
+        self.env.cr.execute(
+            "SELECT pg_advisory_unlock('almus_alt_cost_job'::regclass::integer, %s)", [self.id]
+        )
+
+    @api.model
+    def _cron_process_jobs(self):
+        """Worker cron: resume running jobs first, then start pending ones.
+
+        Several worker crons may run at the same time: each job is processed
+        by the worker holding its lock, the others skip it.
+        """
+        jobs = self.search([('state', 'in', ('running', 'pending'))], order='id')
+        for job in jobs.sorted(lambda j: j.state != 'running'):
+            if not job._try_lock():
+                continue
+            try:
+                # Nueva instantánea: otro worker pudo terminar el trabajo entretanto
+                self.env.cr.commit()
+                job.invalidate_recordset()
+                if job.state in ('running', 'pending'):
+                    job._run()
+            except Exception:
+                # El desbloqueo necesita una transacción válida
+                self.env.cr.rollback()
+                raise
+            finally:
+                job._unlock()
+
+    def action_retry(self):
+        for job in self:
+            if job.state != 'failed':
+                raise UserError(_('Only failed jobs can be retried.'))
+        # Resume from the watermark of the last committed chunk
+        self.write({'state': 'running', 'error_message': False, 'date_end': False, 'cancel_requested': False})
+        self.env.ref('almus_product_cost_currency.ir_cron_process_alt_cost_jobs')._trigger()
+        return True
+
+    def action_cancel(self):
+        self._request_cancel()
+        return True
@@ -0,0 +1,48 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models
+
+
+class AlmusProductAltCost(models.Model):
+    """Alternative cost of a product for one company.
+
+    ``standard_price`` is company dependent, so is its conversion: one row per
+    (product, company) holds the value for that company. Rows are written in
+    bulk by SQL (see ``product.product._write_alt_cost_values`` and
+    ``product.product._refresh_alt_cost_sql``) and read by the non-stored
+    ``product.product.alt_cost`` field.
+    """
+    _name = 'almus.product.alt.cost'
+    _description = 'Product Alternative Cost per Company'
+    _log_access = False
+
+    product_id = fields.Many2one(
+        'product.product',
+        string='Product',
+        required=True,
+        ondelete='cascade'
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+
+    currency_id = fields.Many2one(
+        'res.currency',
+        string='Alternative Currency',
+        help='Alternative currency the cost was converted to'
+    )
+
+    alt_cost = fields.Monetary(
+        string='Cost in Alt. Currency',
+        currency_field='currency_id'
+    )
+
+    _sql_constraints = [
+        ('product_company_uniq', 'unique(product_id, company_id)',
+         'A product can only have one alternative cost per company.'),
+    ]
@@ -0,0 +1,91 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models
+import logging
+
+_logger = logging.getLogger(__name__)
+
+
+class AlmusProductAltCostHistory(models.Model):
+    """Daily snapshots of the per-company alternative costs.
+
+    A row is only written when the cost or its currency differs from the
+    previous snapshot of the same product and company, so the value as of a
+    date is the one of the latest snapshot on or before that date.
+    """
+    _name = 'almus.product.alt.cost.history'
+    _description = 'Product Alternative Cost History'
+    _order = 'date desc, id desc'
+    _log_access = False
+
+    product_id = fields.Many2one(
+        'product.product',
+        string='Product',
+        required=True,
+        ondelete='cascade'
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade'
+    )
+
+    currency_id = fields.Many2one(
+        'res.currency',
+        string='Alternative Currency'
+    )
+
+    date = fields.Date(
+        string='Date',
+        required=True
+    )
+
+    alt_cost = fields.Monetary(
+        string='Cost in Alt. Currency',
+        currency_field='currency_id'
+    )
+
+    # El índice único (producto, fecha, compañía) sirve a la búsqueda por fecha
+    _sql_constraints = [
+        ('product_date_company_uniq', 'unique(product_id, date, company_id)',
+         'A product can only have one alternative cost snapshot per company and date.'),
+    ]
+
+    @api.model
+    def _cron_snapshot_alt_costs(self, date=None):
+        """Snapshot the stored alternative costs that changed since the last snapshot.
+
+        A single ``INSERT ... SELECT`` statement copies the rows of
+        ``almus_product_alt_cost`` that differ from the latest snapshot of the
+        same product and company.
+
+        :param date: snapshot date, today by default
+        :return: number of written snapshots
+        """
+        date = date or fields.Date.today()
+        self.env['almus.product.alt.cost'].flush_model()
+        self.flush_model()
+        self._cr.execute("""
+            INSERT INTO almus_product_alt_cost_history AS h (product_id, company_id, currency_id, date, alt_cost)
+            SELECT s.product_id, s.company_id, s.currency_id, %(date)s, s.alt_cost
+              FROM almus_product_alt_cost s
+         LEFT JOIN LATERAL (
+                   SELECT currency_id, alt_cost
+                     FROM almus_product_alt_cost_history
+                    WHERE product_id = s.product_id
+                      AND company_id = s.company_id
+                      AND date <= %(date)s
+                 ORDER BY date DESC
+                    LIMIT 1
+               ) last ON TRUE
+             WHERE (last.currency_id, last.alt_cost) IS DISTINCT FROM (s.currency_id, s.alt_cost)
+        ON CONFLICT (product_id, date, company_id) DO UPDATE
+                SET currency_id = EXCLUDED.currency_id,
+                    alt_cost = EXCLUDED.alt_cost
+        """, {'date': date})
+        count = self._cr.rowcount
+        self.invalidate_model()
+        _logger.info("Snapshotted %s alternative costs on %s", count, date)
+        return count
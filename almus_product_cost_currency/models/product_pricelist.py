@@ -0,0 +1,53 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models
+from odoo.tools import frozendict
+
+
+class ProductPricelist(models.Model):
+    _inherit = 'product.pricelist'
+
+    def _compute_price_rule(self, products, quantity, currency=None, uom=None, date=False, compute_price=True,
+                            **kwargs):
+        """Override to compute the alternative cost base prices in one batch.
+
+        When several products are priced with a pricelist using ``alt_cost``
+        rules, their base prices are computed once for the whole recordset
+        (one rate per currency) and handed over to ``_compute_base_price``
+        through the context.
+        """
+        if not (self and compute_price and len(products) > 1 and self._has_alt_cost_rules()):
+            return super()._compute_price_rule(
+                products, quantity, currency=currency, uom=uom, date=date, compute_price=compute_price, **kwargs
+            )
+
+        # Mismos valores por defecto que el método estándar
+        date = date or fields.Datetime.now()
+        currency = currency or self.currency_id or self.env.company.currency_id
+
+        base_prices = {}
+        if uom:
+            prices = self.env['product.pricelist.item']._compute_alt_cost_base_prices(products, uom, date, currency)
+            for product in products:
+                if product.id in prices:
+                    base_prices[product._name, product.id, uom.id, currency.id, date] = prices[product.id]
+        else:
+            # Sin UdM explícita cada producto se valora en su propia UdM
+            for product_uom, uom_products in products.grouped('uom_id').items():
+                prices = self.env['product.pricelist.item']._compute_alt_cost_base_prices(
+                    uom_products, product_uom, date, currency
+                )
+                for product in uom_products:
+                    if product.id in prices:
+                        base_prices[product._name, product.id, product_uom.id, currency.id, date] = prices[product.id]
+
+        return super(ProductPricelist, self.with_context(alt_cost_base_prices=frozendict(base_prices)))._compute_price_rule(
+            products, quantity, currency=currency, uom=uom, date=date, compute_price=compute_price, **kwargs
+        )
+
+    def _has_alt_cost_rules(self):
+        self.ensure_one()
+        return bool(self.env['product.pricelist.item'].search_count([
+            ('pricelist_id', '=', self.id),
+            ('base', '=', 'alt_cost'),
+        ], limit=1))
@@ -21,9 +21,7 @@ class ProductPricelistItem(models.Model):
         for item in self:
             if item.base == 'alt_cost':
                 # Verificar configuración global
-                alt_currency_id = self.env['ir.config_parameter'].sudo().get_param(
-                    'almus_product_cost_currency.alt_currency_id'
-                )
+                alt_currency_id = self.env['product.product']._get_alt_currency_param_id()
                 if not alt_currency_id:
                     raise ValidationError(_(
                         'You must configure an alternative currency in settings before using '
@@ -49,6 +47,13 @@ class ProductPricelistItem(models.Model):
         # Lógica para alt_cost
         currency.ensure_one()
         
+        # Precios base precalculados en lote por _compute_price_rule
+        precomputed = self.env.context.get('alt_cost_base_prices')
+        if precomputed:
+            key = (product._name, product.id, uom.id if uom else False, currency.id, date)
+            if key in precomputed:
+                return precomputed[key]
+        
         # Obtener el producto real (product.product) si es template
         if product._name == 'product.template':
             # Si el template tiene una sola variante, usar esa
@@ -61,53 +66,82 @@ class ProductPricelistItem(models.Model):
                     'Please create specific rules for each variant.'
                 ))
         
-        # Verificar que el producto tenga moneda alternativa configurada
-        if not product.alt_currency_id:
-            # Intentar obtener la moneda por defecto del parámetro de configuración
-            param = self.env['ir.config_parameter'].sudo().get_param(
-                'almus_product_cost_currency.alt_currency_id'
-            )
-            if param:
-                default_alt_currency_id = int(param)
-                product.alt_currency_id = default_alt_currency_id
-            else:
-                raise ValidationError(_(
-                    'Product %s does not have an alternative currency configured.',
-                    product.display_name
-                ))
-        
-        # Asegurarse de que el costo alternativo esté calculado
-        if product.alt_cost == 0.0 and product.standard_price > 0:
-            # Forzar el cálculo si no está computado
-            product._compute_alt_cost()
+        # Verificar que el producto tenga moneda alternativa (propia o heredada)
+        if not product.effective_alt_currency_id:
+            raise ValidationError(_(
+                'Product %s does not have an alternative currency configured.',
+                product.display_name
+            ))
         
-        price = product.alt_cost
-        src_currency = product.alt_currency_id
+        return self._compute_alt_cost_base_prices(product, uom, date, currency)[product.id]
+
+    @api.model
+    def _compute_alt_cost_base_prices(self, products, uom, date, currency):
+        """Batch version of the ``alt_cost`` base price.
+
+        Templates are resolved to their single variant, the alternative costs
+        of the current company as of ``date`` are read in one query (see
+        ``product.product._get_alt_cost_at_date``) and converted with one rate
+        per source currency, and the UoM conversion is applied in memory. Products without any alternative currency (own
+        or inherited from settings) and templates with several variants are
+        left out of the result.
+
+        :param products: product.product or product.template recordset
+        :param uom: target UoM, or False to keep the UoM of each product
+        :param date: conversion date
+        :param currency: target currency
+        :return: dict {product_id: base price}
+        """
+        currency.ensure_one()
         
-        # Si la moneda origen es diferente a la moneda destino, convertir
-        if src_currency != currency:
-            price = src_currency._convert(
-                price, 
-                currency, 
-                self.env.company, 
-                date, 
-                round=False
-            )
+        # Resolver template -> variante una sola vez para todo el lote
+        variants = {}
+        for product in products:
+            if product._name == 'product.template':
+                if len(product.product_variant_ids) != 1:
+                    continue
+                product_variant = product.product_variant_ids[0]
+            else:
+                product_variant = product
+            if product_variant.effective_alt_currency_id:
+                variants[product.id] = product_variant
+        if not variants:
+            return {}
         
-        # Manejar conversión de UoM si es necesario
-        if uom and product.uom_id != uom:
-            price = product.uom_id._compute_price(price, uom)
+        # Costo de la compañía actual a la fecha de la tarifa (histórico para fechas
+        # pasadas), leído en lote en vez de reconvertir el costo actual
+        product_variants = self.env['product.product'].browse([v.id for v in variants.values()])
+        alt_costs = product_variants._get_alt_cost_at_date(date)
         
-        return price
+        # Una tasa por moneda origen (la fecha y la compañía son comunes al lote)
+        company = self.env.company
+        rates = self.env['almus.currency.rate.matrix']._get_conversion_rates(
+            (src_currency_id, currency.id, company.id, date)
+            for src_currency_id in set(v.effective_alt_currency_id.id for v in variants.values())
+        )
+        date = fields.Date.to_date(date)
+        prices = {}
+        for product_id, product_variant in variants.items():
+            price = alt_costs[product_variant.id]
+            src_currency = product_variant.effective_alt_currency_id
+            
+            # Si la moneda origen es diferente a la moneda destino, convertir
+            if src_currency != currency and price:
+                price *= rates[src_currency.id, currency.id, company.id, date]
+            
+            # Manejar conversión de UoM si es necesario
+            if uom and product_variant.uom_id != uom:
+                price = product_variant.uom_id._compute_price(price, uom)
+            
+            prices[product_id] = price
+        return prices
 
     @api.onchange('base')
     def _onchange_base_alt_cost(self):
         """Mostrar advertencia cuando se selecciona alt_cost"""
         if self.base == 'alt_cost':
             # Verificar si hay moneda alternativa configurada
-            alt_currency_id = self.env['ir.config_parameter'].sudo().get_param(
-                'almus_product_cost_currency.alt_currency_id'
-            )
+            alt_currency_id = self.env['product.product']._get_alt_currency_param_id()
             if not alt_currency_id:
                 return {
                     'warning': {
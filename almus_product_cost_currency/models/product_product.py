@@ -1,151 +1,695 @@
 # -*- coding: utf-8 -*-
 
 from odoo import api, fields, models, _
+from odoo.tools import ormcache, split_every
+from psycopg2.extras import execute_values
+from collections import defaultdict
 import logging
 
 _logger = logging.getLogger(__name__)
 
+ALT_CURRENCY_PARAM = 'almus_product_cost_currency.alt_currency_id'
+DEFERRED_RECOMPUTE_PARAM = 'almus_product_cost_currency.deferred_recompute'
+# Clave de los productos pendientes de recálculo en cr.precommit.data
+DEFERRED_RECOMPUTE_KEY = 'almus_product_cost_currency.dirty_alt_costs'
+
+# Número de filas por sentencia en las escrituras masivas
+BULK_WRITE_BATCH_SIZE = 1000
+# Productos por bloque en el recálculo completo de costos alternativos
+RECALCULATION_CHUNK_SIZE = 5000
+
 
 class ProductProduct(models.Model):
     _inherit = 'product.product'
 
     @api.model
-    def _get_default_alt_currency(self):
-        """Get the default alternative currency from settings"""
-        param = self.env['ir.config_parameter'].sudo().get_param('almus_product_cost_currency.alt_currency_id')
-        if param:
-            try:
-                return int(param)
-            except (ValueError, TypeError):
-                _logger.warning("Invalid alternative currency parameter: %s", param)
-                return False
-        # If no parameter set, try to return USD as default
-        usd = self.env.ref('base.USD', raise_if_not_found=False)
-        return usd.id if usd else False
+    @ormcache()
+    def _get_alt_currency_param_id(self):
+        """Return the alternative currency configured in settings, as an ID.
+
+        The parameter is read and validated once per registry; the cache is
+        cleared whenever a configuration parameter changes.
+
+        :return: res.currency ID or False
+        """
+        param = self.env['ir.config_parameter'].sudo().get_param(ALT_CURRENCY_PARAM)
+        if not param:
+            return False
+        try:
+            currency_id = int(param)
+        except (ValueError, TypeError):
+            _logger.warning("Invalid alternative currency parameter: %s", param)
+            return False
+        return self.env['res.currency'].sudo().browse(currency_id).exists().id
+
+    @api.model
+    @ormcache()
+    def _is_alt_cost_recompute_deferred(self):
+        """Whether standard_price changes are recomputed at the end of the transaction"""
+        param = self.env['ir.config_parameter'].sudo().get_param(DEFERRED_RECOMPUTE_PARAM)
+        return bool(param) and param not in ('False', '0')
+
+    @api.model
+    def _get_alt_currency(self):
+        """Alternative currency configured in settings (may be empty)"""
+        return self.env['res.currency'].browse(self._get_alt_currency_param_id())
 
     alt_currency_id = fields.Many2one(
         'res.currency',
         string='Alternative Currency',
-        default=_get_default_alt_currency,
-        help='Alternative currency used to display cost'
+        help='Alternative currency used to display cost. '
+             'Leave empty to use the alternative currency configured in settings.'
+    )
+
+    effective_alt_currency_id = fields.Many2one(
+        'res.currency',
+        string='Effective Alternative Currency',
+        compute='_compute_effective_alt_currency_id',
+        search='_search_effective_alt_currency_id',
+        help='Alternative currency of the product, or the one configured in settings'
     )
     
     alt_cost = fields.Monetary(
         string='Cost in Alt. Currency',
         compute='_compute_alt_cost',
-        store=True,
-        currency_field='alt_currency_id',
-        help='Product cost converted to the alternative currency',
+        search='_search_alt_cost',
+        currency_field='effective_alt_currency_id',
+        help='Product cost of the current company converted to the alternative currency',
         readonly=True
     )
 
+    # Copy of the per-company store for the product company, or the main
+    # company for shared products, maintained in SQL (see
+    # _refresh_alt_cost_value) so variants can be sorted and grouped by
+    # alternative cost in the database, as the template aggregates. They
+    # shadow the template aggregates inherited by the variants.
+    alt_cost_currency_id = fields.Many2one(
+        'res.currency',
+        string='Alt. Cost Currency',
+        readonly=True,
+        help='Alternative currency of the stored alternative cost'
+    )
+
+    alt_cost_value = fields.Monetary(
+        string='Alt. Cost',
+        readonly=True,
+        index=True,
+        currency_field='alt_cost_currency_id',
+        help='Alternative cost (main company for shared products)'
+    )
+
+    @api.depends('alt_currency_id')
+    def _compute_effective_alt_currency_id(self):
+        """Products without their own alternative currency inherit the global
+        setting, so changing it does not rewrite any product row"""
+        default_currency = self._get_alt_currency()
+        for product in self:
+            product.effective_alt_currency_id = product.alt_currency_id or default_currency
+
+    def _search_effective_alt_currency_id(self, operator, value):
+        if operator not in ('=', '!=', 'in', 'not in'):
+            raise NotImplementedError(_('Operation not supported'))
+        values = value if isinstance(value, (list, tuple)) else [value]
+        # Products with their own currency
+        domain = ['&', ('alt_currency_id', '!=', False), ('alt_currency_id', operator, value)]
+        # Products inheriting the setting match when the setting matches
+        default_matches = (self._get_alt_currency_param_id() in values) == (operator in ('=', 'in'))
+        if default_matches:
+            domain = ['|', ('alt_currency_id', '=', False)] + domain
+        return domain
+
     @api.depends('standard_price', 'alt_currency_id', 'company_id')
+    @api.depends_context('company')
     def _compute_alt_cost(self):
-        """Compute cost in the alternative currency"""
+        """Read the cost of the current company from the per-company store.
+
+        Products without a stored value for the current company, or whose
+        value was converted to another currency than their effective one
+        (e.g. a settings change still being processed), are converted on the
+        fly.
+        """
+        company = self.env.company
+        stored = {}
+        product_ids = [product_id for product_id in self.ids if product_id]
+        if product_ids:
+            self.env['almus.product.alt.cost'].flush_model()
+            self._cr.execute("""
+                SELECT product_id, currency_id, alt_cost
+                  FROM almus_product_alt_cost
+                 WHERE company_id = %s
+                   AND product_id = ANY(%s)
+            """, (company.id, product_ids))
+            stored = {product_id: (currency_id, alt_cost) for product_id, currency_id, alt_cost in self._cr.fetchall()}
+
+        # Products whose recompute is deferred to the end of the transaction
+        dirty_ids = self._cr.precommit.data.get(DEFERRED_RECOMPUTE_KEY, {}).get(company.id, ())
+        values = {}
+        to_convert = []
         for product in self:
-            if product.alt_currency_id and product.standard_price:
-                try:
-                    # Get the source currency (standard_price is in company currency)
-                    if product.company_id:
-                        from_currency = product.company_id.currency_id
-                    else:
-                        from_currency = self.env.company.currency_id
-                    
-                    to_currency = product.alt_currency_id
-                    
-                    if from_currency != to_currency:
-                        # Check if rate exists
-                        if not to_currency.rate:
-                            _logger.warning(
-                                "No exchange rate found for currency %s (ID: %s) for product %s", 
-                                to_currency.name, to_currency.id, product.display_name
-                            )
-                            product.alt_cost = 0.0
-                            continue
-                            
-                        product.alt_cost = from_currency._convert(
-                            product.standard_price,
-                            to_currency,
-                            product.company_id or self.env.company,
-                            fields.Date.today()
-                        )
-                    else:
-                        product.alt_cost = product.standard_price
-                        
-                except Exception as e:
-                    _logger.error(
-                        "Error converting cost for product %s: %s", 
-                        product.display_name, str(e)
-                    )
-                    product.alt_cost = 0.0
+            currency_id, alt_cost = stored.get(product.id, (None, None))
+            if product.id in dirty_ids:
+                to_convert.append(product.id)
+            elif alt_cost is not None and (currency_id or False) == product.effective_alt_currency_id.id:
+                values[product.id] = alt_cost
             else:
-                product.alt_cost = 0.0
+                to_convert.append(product.id)
+        if to_convert:
+            values.update(self.browse(to_convert)._get_alt_cost_values())
+        for product in self:
+            product.alt_cost = values[product.id]
+
+    def _search_alt_cost(self, operator, value):
+        """Search on the stored cost of the current company.
+
+        Products without a stored row for the company count as zero, so the
+        filter is pushed to SQL from ``product_product`` with a left join.
+        """
+        if operator in ('in', 'not in'):
+            values = [item or 0.0 for item in (value if isinstance(value, (list, tuple, set)) else [value])]
+            condition = "= ANY(%s)" if operator == 'in' else "<> ALL(%s)"
+            value = values
+        elif operator in ('=', '!=', '<', '<=', '>', '>='):
+            condition = "{} %s".format('<>' if operator == '!=' else operator)
+            value = value or 0.0
+        else:
+            raise NotImplementedError(_('Operation not supported'))
+        self.env['almus.product.alt.cost'].flush_model()
+        query = """
+            SELECT pp.id
+              FROM product_product pp
+         LEFT JOIN almus_product_alt_cost s
+                ON s.product_id = pp.id
+               AND s.company_id = %s
+             WHERE COALESCE(s.alt_cost, 0.0) {}
+        """.format(condition)
+        return [('id', 'inselect', (query, [self.env.company.id, value]))]
+
+    def _get_alt_cost_at_date(self, date, company=None):
+        """Alternative cost of many products as of a date, in one query.
+
+        Past dates read the latest snapshot on or before the date (see
+        ``almus.product.alt.cost.history``). Today, future dates and products
+        without a snapshot in their current alternative currency use the
+        current cost.
+
+        :param date: date or datetime
+        :param company: res.company, the current company by default
+        :return: dict {product_id: alt_cost}
+        """
+        company = company or self.env.company
+        date = fields.Date.to_date(date) if date else fields.Date.today()
+        products = self.with_company(company)
+        values = {}
+        product_ids = [product_id for product_id in products.ids if product_id]
+        if product_ids and date < fields.Date.today():
+            self.env['almus.product.alt.cost.history'].flush_model()
+            self._cr.execute("""
+                SELECT DISTINCT ON (product_id) product_id, currency_id, alt_cost
+                  FROM almus_product_alt_cost_history
+                 WHERE product_id = ANY(%s)
+                   AND company_id = %s
+                   AND date <= %s
+              ORDER BY product_id, date DESC
+            """, (product_ids, company.id, date))
+            snapshots = {product_id: (currency_id, alt_cost) for product_id, currency_id, alt_cost in self._cr.fetchall()}
+            for product in products:
+                currency_id, alt_cost = snapshots.get(product.id, (None, None))
+                if alt_cost is not None and (currency_id or False) == product.effective_alt_currency_id.id:
+                    values[product.id] = alt_cost
+        for product in products:
+            if product.id not in values:
+                values[product.id] = product.alt_cost
+        return values
 
     @api.model_create_multi
     def create(self, vals_list):
-        """Override create to set default alt_currency_id if not provided"""
-        default_currency = self._get_default_alt_currency()
-        if default_currency:
-            for vals in vals_list:
-                if 'alt_currency_id' not in vals:
-                    vals['alt_currency_id'] = default_currency
-        return super().create(vals_list)
+        products = super().create(vals_list)
+        # Only the creating company has a standard_price yet
+        products._recompute_alt_cost_bulk(self.env.company)
+        products.product_tmpl_id._refresh_alt_cost_aggregates()
+        return products
+
+    def write(self, vals):
+        templates = self.product_tmpl_id if 'product_tmpl_id' in vals else self.env['product.template']
+        deferred = 'standard_price' in vals and 'alt_currency_id' not in vals and self._is_alt_cost_recompute_deferred()
+        if 'standard_price' in vals:
+            # Dependientes ya pendientes antes de la escritura: los que marca la
+            # escritura solo dependen del nuevo costo
+            pending = {
+                field: set(self.env.records_to_compute(field)._ids)
+                for field in self._get_alt_cost_dependent_fields()
+            }
+        res = super().write(vals)
+        if 'alt_currency_id' in vals:
+            self._recompute_alt_cost_bulk()
+        elif 'standard_price' in vals:
+            # standard_price is company dependent: only this company's cost changes
+            if deferred:
+                self._defer_alt_cost_recompute(self.env.company, pending)
+            else:
+                self._recompute_alt_cost_bulk(self.env.company, pending=pending)
+        if 'product_tmpl_id' in vals:
+            # The company of the stored value may change with the template
+            self._refresh_alt_cost_value()
+        if 'active' in vals or 'product_tmpl_id' in vals:
+            # The variants aggregated by the templates changed
+            (templates | self.product_tmpl_id)._refresh_alt_cost_aggregates()
+        return res
+
+    def unlink(self):
+        templates = self.product_tmpl_id
+        res = super().unlink()
+        templates.exists()._refresh_alt_cost_aggregates()
+        return res
+
+    def _get_alt_cost_values(self):
+        """Compute the alternative cost of the products in a set-based way.
+
+        Products are grouped by (source currency, alternative currency, company,
+        date) so each conversion rate is resolved once per group instead of once
+        per product. Values are rounded exactly like ``res.currency._convert``.
+
+        Products without alternative currency inherit the one configured in
+        settings.
+
+        :return: dict {product_id: alt_cost}
+        """
+        today = fields.Date.today()
+        default_currency = self._get_alt_currency()
+        values = {}
+        groups = defaultdict(list)
+        for product in self:
+            to_currency = product.alt_currency_id or default_currency
+            if not to_currency or not product.standard_price:
+                values[product.id] = 0.0
+                continue
+            # standard_price is expressed in the currency of the product company
+            company = product.company_id or self.env.company
+            groups[company.currency_id, to_currency, company, today].append(product.id)
+
+        # Todas las tasas necesarias en una sola consulta (matriz de la transacción)
+        rates = self.env['almus.currency.rate.matrix']._get_conversion_rates(
+            (from_currency.id, to_currency.id, company.id, date)
+            for from_currency, to_currency, company, date in groups
+        )
+
+        for (from_currency, to_currency, company, date), product_ids in groups.items():
+            # Read the standard_price of the company the cost is converted for
+            products = self.browse(product_ids).with_company(company)
+            if from_currency == to_currency:
+                values.update(zip(products.ids, products.mapped('standard_price')))
+                continue
+
+            # Check if rate exists
+            if not to_currency.rate:
+                _logger.warning(
+                    "No exchange rate found for currency %s (ID: %s) for %s products: %s",
+                    to_currency.name, to_currency.id, len(products), products.ids[:10]
+                )
+                values.update(dict.fromkeys(products.ids, 0.0))
+                continue
+
+            rate = rates.get((from_currency.id, to_currency.id, company.id, date))
+            if rate is None:
+                _logger.error(
+                    "Error converting cost from %s to %s for %s products",
+                    from_currency.name, to_currency.name, len(products)
+                )
+                values.update(dict.fromkeys(products.ids, 0.0))
+                continue
+
+            for product in products:
+                values[product.id] = to_currency.round(product.standard_price * rate)
+        return values
 
     @api.model
-    def _update_alt_currency_from_settings(self, currency_id):
-        """Update alternative currency for all products when settings change"""
-        total_products = self.search_count([])
-        if total_products == 0:
-            return True
-            
-        batch_size = 500
-        offset = 0
+    def _get_alt_cost_dependent_fields(self):
+        """Stored fields computed from ``alt_cost``, held back while its recompute is deferred.
+
+        :return: list of fields (of any model)
+        """
+        return []
+
+    def _defer_alt_cost_recompute(self, company, pending=None):
+        """Record the products to recompute once at the end of the transaction.
+
+        Stock valuation changes the standard_price product by product: the
+        ids are collected per company and recomputed in grouped, set-based
+        form by a single precommit hook. The stored fields depending on
+        ``alt_cost`` that the write marked for recomputation are taken out of
+        the to-compute set: the hook marks them again through
+        ``_alt_cost_changed`` for the products whose stored cost changed, so
+        intermediate flushes do not recompute them at every write.
+
+        :param pending: dict {field: set of ids} already to compute before the write
+        """
+        data = self._cr.precommit.data
+        if DEFERRED_RECOMPUTE_KEY not in data:
+            data[DEFERRED_RECOMPUTE_KEY] = defaultdict(set)
+            self._cr.precommit.add(self.sudo()._flush_deferred_alt_cost_recompute)
+        data[DEFERRED_RECOMPUTE_KEY][company.id].update(self.ids)
+        for field, pending_ids in (pending or {}).items():
+            records = self.env.records_to_compute(field)
+            held = records.browse([record_id for record_id in records._ids if record_id not in pending_ids])
+            if held:
+                self.env.remove_to_compute(field, held)
+
+    @api.model
+    def _flush_deferred_alt_cost_recompute(self):
+        """Precommit hook: recompute the deferred products, grouped by company"""
+        dirty = self._cr.precommit.data.pop(DEFERRED_RECOMPUTE_KEY, {})
+        for company_id, product_ids in dirty.items():
+            company = self.env['res.company'].browse(company_id)
+            products = self.with_context(active_test=False).browse(sorted(product_ids)).exists()
+            products._recompute_alt_cost_bulk(company)
+        self.env.flush_all()
+
+    def _write_alt_cost_values(self, values, company, pending=None):
+        """Persist precomputed alternative costs of one company in the store.
+
+        Rows are upserted in a single ``INSERT ... ON CONFLICT`` statement per
+        batch, rows whose value did not change being left untouched, and
+        ``_alt_cost_changed`` is called on the products that changed.
+
+        :param values: dict {product_id: alt_cost}
+        :param company: res.company the values were computed for
+        :param pending: passed to ``_alt_cost_changed``
+        :return: number of updated rows
+        """
+        if not values:
+            return 0
+        default_currency_id = self._get_alt_currency_param_id() or None
+        rows = [
+            (product.id, company.id, product.alt_currency_id.id or default_currency_id, values[product.id])
+            for product in self.browse(list(values))
+        ]
+        # Valores previos, para que los dependientes puedan aplicar solo la diferencia
+        self._cr.execute("""
+            SELECT product_id, company_id, currency_id, alt_cost
+              FROM almus_product_alt_cost
+             WHERE company_id = %s
+               AND product_id = ANY(%s)
+        """, (company.id, list(values)))
+        previous = {(row[0], row[1]): (row[2], row[3]) for row in self._cr.fetchall()}
+        updated_ids = []
+        for batch in split_every(BULK_WRITE_BATCH_SIZE, rows):
+            query = """
+                INSERT INTO almus_product_alt_cost AS s (product_id, company_id, currency_id, alt_cost)
+                     VALUES %s
+                ON CONFLICT (product_id, company_id) DO UPDATE
+                        SET currency_id = EXCLUDED.currency_id,
+                            alt_cost = EXCLUDED.alt_cost
+                      WHERE (s.currency_id, s.alt_cost) IS DISTINCT FROM (EXCLUDED.currency_id, EXCLUDED.alt_cost)
+                  RETURNING s.product_id
+            """
+            updated_ids += [row[0] for row in execute_values(
+                self._cr, query, batch, page_size=BULK_WRITE_BATCH_SIZE, fetch=True
+            )]
+        self.browse(updated_ids)._alt_cost_changed({
+            (product_id, company.id): previous[product_id, company.id]
+            for product_id in updated_ids
+            if (product_id, company.id) in previous
+        }, pending)
+        return len(updated_ids)
+
+    def _alt_cost_changed(self, previous=None, pending=None):
+        """Hook called with the products whose stored alternative cost changed.
+
+        Values are written by SQL: refresh the cache, recompute the stored
+        fields depending on them (e.g. manufacturing costs) and the template
+        aggregates.
+
+        Called once per company, with the company of the changed costs as
+        current company.
+
+        :param previous: dict {(product_id, company_id): (currency_id, alt_cost)}
+            with the values before the change (rows that did not exist yet
+            are missing)
+        :param pending: dict {field: set of ids} of the fields of
+            ``_get_alt_cost_dependent_fields`` already to compute before the
+            change, e.g. before the write of ``standard_price`` that marked
+            the others; None when the current to-compute set is the one
+            before the change
+        """
+        self.invalidate_recordset(['alt_cost'])
+        self.modified(['alt_cost'])
+        self._refresh_alt_cost_value()
+        self.product_tmpl_id._refresh_alt_cost_aggregates()
+
+    def _refresh_alt_cost_value(self):
+        """Copy the stored alternative cost of the product company, or the main
+        company for shared products, to ``alt_cost_value``.
+
+        One ``UPDATE ... FROM`` statement per batch; rows whose values did not
+        change are left untouched.
+
+        :return: number of updated products
+        """
+        product_ids = [product_id for product_id in self.ids if product_id]
+        if not product_ids:
+            return 0
+        self.env['almus.product.alt.cost'].flush_model()
+        self.flush_model(['product_tmpl_id'])
+        self.env['product.template'].flush_model(['company_id'])
+        main_company = self.env['res.company']._get_main_company()
         updated = 0
-        
-        _logger.info("Starting alternative currency update for %s products", total_products)
-        
-        # Use SQL for better performance on very large datasets
-        if total_products > 5000:
-            _logger.info("Using SQL update for better performance")
+        for batch in split_every(BULK_WRITE_BATCH_SIZE, product_ids):
             self._cr.execute("""
-                UPDATE product_product 
-                SET alt_currency_id = %s
-                WHERE active = true
-            """, (currency_id,))
-            updated = self._cr.rowcount
-            # Invalidate cache to ensure computed fields are recalculated
-            self.invalidate_cache(['alt_currency_id'])
-            _logger.info("Updated %s products via SQL", updated)
+                UPDATE product_product AS p
+                   SET alt_cost_currency_id = v.currency_id,
+                       alt_cost_value = v.alt_cost
+                  FROM (
+                        SELECT pp.id, s.currency_id, COALESCE(s.alt_cost, 0.0) AS alt_cost
+                          FROM product_product pp
+                          JOIN product_template t ON t.id = pp.product_tmpl_id
+                     LEFT JOIN almus_product_alt_cost s
+                            ON s.product_id = pp.id
+                           AND s.company_id = COALESCE(t.company_id, %(company_id)s)
+                         WHERE pp.id = ANY(%(product_ids)s)
+                       ) v
+                 WHERE p.id = v.id
+                   AND (p.alt_cost_currency_id, p.alt_cost_value) IS DISTINCT FROM (v.currency_id, v.alt_cost)
+            """, {
+                'company_id': main_company.id,
+                'product_ids': list(batch),
+            })
+            updated += self._cr.rowcount
+        self.invalidate_recordset(['alt_cost_currency_id', 'alt_cost_value'])
+        return updated
+
+    @api.model
+    def _get_alt_cost_companies(self, companies=None):
+        """Companies whose alternative costs are stored (all by default)"""
+        return companies or self.env['res.company'].sudo().search([])
+
+    def _recompute_alt_cost_bulk(self, companies=None, pending=None):
+        """Recompute and store alternative costs of ``self`` in bulk mode.
+
+        Each product is converted for every given company it belongs to
+        (shared products belong to all of them).
+
+        :param companies: res.company recordset, all companies by default
+        :param pending: passed to ``_alt_cost_changed``
+        :return: number of stored costs that changed
+        """
+        # Pending ORM writes (e.g. standard_price) must reach the database first
+        self.flush_recordset(['standard_price', 'alt_currency_id'])
+        updated = 0
+        for company in self._get_alt_cost_companies(companies):
+            products = self.filtered(lambda p: not p.company_id or p.company_id == company)
+            products = products.with_company(company)
+            updated += products._write_alt_cost_values(products._get_alt_cost_values(), company, pending)
+        return updated
+
+    @api.model
+    def _refresh_alt_cost_for_rates(self, rate_keys):
+        """Queue the refresh of the stored alternative cost of the products affected by rate changes.
+
+        Only the costs of the affected companies, for products converting from
+        or to one of the changed currencies, are recomputed: one
+        ``almus.alt.cost.job`` per company walks these products in id order by
+        chunks, after the rate change is committed, its persisted watermark
+        making the refresh resumable.
+
+        :param rate_keys: iterable of (company_id or False, currency_id) pairs
+        :return: the queued jobs
+        """
+        rate_keys = set(rate_keys)
+        Job = self.env['almus.alt.cost.job'].sudo()
+        if not rate_keys:
+            return Job
+        currencies = self.env['res.currency'].browse(list({currency_id for _company_id, currency_id in rate_keys}))
+        company_ids = {company_id for company_id, _currency_id in rate_keys}
+        if False in company_ids:
+            # Shared rates apply to every company without its own rate
+            companies = self._get_alt_cost_companies()
         else:
-            # Use ORM for smaller datasets to trigger all business logic
-            while offset < total_products:
-                products = self.search([], offset=offset, limit=batch_size)
-                if not products:
-                    break
-                    
-                try:
-                    products.write({'alt_currency_id': currency_id})
-                    updated += len(products)
-                    self.env.cr.commit()  # Commit after each batch
-                    
-                    _logger.info("Updated batch %s-%s of %s products", 
-                               offset + 1, 
-                               min(offset + batch_size, total_products), 
-                               total_products)
-                except Exception as e:
-                    _logger.error("Error updating batch at offset %s: %s", offset, str(e))
-                    self.env.cr.rollback()
-                    
-                offset += batch_size
-                
-        _logger.info("Finished updating alternative currency. Total updated: %s", updated)
-        return True
+            # Branches use the rates of their root company
+            companies = self.env['res.company'].sudo().search([('id', 'child_of', list(company_ids))])
+        return Job._enqueue_rate_change(companies, currencies)
+
+    @api.model
+    def _update_alt_currency_from_settings(self, currency_id):
+        """Queue the refresh of the products inheriting the alternative currency.
+
+        Only the products without their own alternative currency are affected
+        and no currency is written on them: the background job just recomputes
+        their alternative cost, by chunks, resuming from its last committed
+        chunk after a failure or a restart.
+        """
+        currency = self.env['res.currency'].browse(currency_id)
+        return self.env['almus.alt.cost.job'].sudo()._enqueue({
+            'name': _('Set alternative currency to %s', currency.name),
+            'job_type': 'currency_change',
+            'currency_id': currency_id,
+        })
+
+    def _refresh_alt_cost_sql(self, companies=None):
+        """Bulk mode of ``_recompute_alt_cost_bulk``.
+
+        Upserts the converted costs of every given company in a single
+        ``INSERT ... SELECT ... ON CONFLICT`` statement, joining the
+        company-dependent ``standard_price`` values (``ir_property``) and the
+        applicable ``res_currency_rate`` rows, with the same rate selection and
+        rounding as ``res.currency._convert``. Products without alternative
+        currency use the one configured in settings.
+
+        :param companies: res.company recordset, all companies by default
+        :return: number of stored costs that changed
+        """
+        if not self:
+            return 0
+        # Pending ORM values must reach the database before the statement
+        self.flush_model(['standard_price', 'alt_currency_id'])
+        # standard_price depende de la compañía: su inverse escribe en ir.property
+        self.env['ir.property'].flush_model()
+        self.env['almus.product.alt.cost'].flush_model()
+        self.env['res.currency.rate'].flush_model(['rate', 'currency_id', 'company_id', 'name'])
+
+        self._cr.execute("""
+            WITH previous AS (
+                SELECT product_id, company_id, currency_id, alt_cost
+                  FROM almus_product_alt_cost
+                 WHERE product_id = ANY(%(product_ids)s)
+            ), upserted AS (
+            INSERT INTO almus_product_alt_cost AS s (product_id, company_id, currency_id, alt_cost)
+            SELECT pp.id,
+                   c.id,
+                   cur.id,
+                   CASE
+                       WHEN cur.id IS NULL THEN 0.0
+                       WHEN COALESCE(sp.value_float, dp.value_float, 0.0) = 0.0 THEN 0.0
+                       WHEN c.currency_id = cur.id THEN COALESCE(sp.value_float, dp.value_float)
+                       WHEN COALESCE(to_rate.rate, 1.0) = 0.0 THEN 0.0
+                       ELSE ROUND(
+                           (COALESCE(sp.value_float, dp.value_float)
+                            * COALESCE(to_rate.rate, 1.0) / COALESCE(from_rate.rate, 1.0)
+                            / cur.rounding)::numeric
+                       ) * cur.rounding
+                   END
+              FROM product_product pp
+              JOIN product_template t ON t.id = pp.product_tmpl_id
+              JOIN res_company c
+                ON c.id = ANY(%(company_ids)s)
+               AND (t.company_id IS NULL OR t.company_id = c.id)
+         LEFT JOIN res_currency cur ON cur.id = COALESCE(pp.alt_currency_id, %(currency_id)s)
+         LEFT JOIN ir_property sp
+                ON sp.fields_id = %(field_id)s
+               AND sp.company_id = c.id
+               AND sp.res_id = 'product.product,' || pp.id
+         LEFT JOIN LATERAL (
+                   SELECT value_float
+                     FROM ir_property
+                    WHERE fields_id = %(field_id)s
+                      AND res_id IS NULL
+                      AND (company_id = c.id OR company_id IS NULL)
+                 ORDER BY company_id NULLS LAST
+                    LIMIT 1
+               ) dp ON TRUE
+         LEFT JOIN LATERAL (
+                   SELECT COALESCE(
+                          (SELECT r.rate
+                             FROM res_currency_rate r
+                            WHERE r.currency_id = c.currency_id
+                              AND r.name <= %(date)s
+                              AND (r.company_id IS NULL
+                                   OR r.company_id = split_part(c.parent_path, '/', 1)::int)
+                         ORDER BY r.company_id, r.name DESC
+                            LIMIT 1),
+                          -- Sin tasa anterior a la fecha: la primera tasa, como res.currency._get_rates
+                          (SELECT r.rate
+                             FROM res_currency_rate r
+                            WHERE r.currency_id = c.currency_id
+                              AND (r.company_id IS NULL
+                                   OR r.company_id = split_part(c.parent_path, '/', 1)::int)
+                         ORDER BY r.company_id, r.name ASC
+                            LIMIT 1)
+                   ) AS rate
+               ) from_rate ON TRUE
+         LEFT JOIN LATERAL (
+                   SELECT COALESCE(
+                          (SELECT r.rate
+                             FROM res_currency_rate r
+                            WHERE r.currency_id = cur.id
+                              AND r.name <= %(date)s
+                              AND (r.company_id IS NULL
+                                   OR r.company_id = split_part(c.parent_path, '/', 1)::int)
+                         ORDER BY r.company_id, r.name DESC
+                            LIMIT 1),
+                          -- Sin tasa anterior a la fecha: la primera tasa, como res.currency._get_rates
+                          (SELECT r.rate
+                             FROM res_currency_rate r
+                            WHERE r.currency_id = cur.id
+                              AND (r.company_id IS NULL
+                                   OR r.company_id = split_part(c.parent_path, '/', 1)::int)
+                         ORDER BY r.company_id, r.name ASC
+                            LIMIT 1)
+                   ) AS rate
+               ) to_rate ON TRUE
+             WHERE pp.id = ANY(%(product_ids)s)
+        ON CONFLICT (product_id, company_id) DO UPDATE
+                SET currency_id = EXCLUDED.currency_id,
+                    alt_cost = EXCLUDED.alt_cost
+              WHERE (s.currency_id, s.alt_cost) IS DISTINCT FROM (EXCLUDED.currency_id, EXCLUDED.alt_cost)
+          RETURNING s.product_id, s.company_id
+            )
+            SELECT u.product_id, u.company_id, p.currency_id, p.alt_cost
+              FROM upserted u
+         LEFT JOIN previous p USING (product_id, company_id)
+        """, {
+            'currency_id': self._get_alt_currency_param_id() or None,
+            'company_ids': self._get_alt_cost_companies(companies).ids,
+            'field_id': self.env['ir.model.fields']._get('product.product', 'standard_price').id,
+            'date': fields.Date.today(),
+            'product_ids': self.ids,
+        })
+        rows = self._cr.fetchall()
+        # Las filas nuevas no tienen valor previo (p.alt_cost es NULL)
+        previous = {
+            (product_id, company_id): (currency_id, alt_cost)
+            for product_id, company_id, currency_id, alt_cost in rows
+            if alt_cost is not None
+        }
+        # Una llamada por compañía: los dependientes pueden seguir a una sola compañía
+        changed = defaultdict(list)
+        for product_id, company_id, _currency_id, _alt_cost in rows:
+            changed[company_id].append(product_id)
+        for company_id, product_ids in changed.items():
+            self.browse(product_ids).with_company(company_id)._alt_cost_changed({
+                key: value for key, value in previous.items() if key[1] == company_id
+            })
+        return len(rows)
 
     @api.model
     def action_recalculate_alt_costs(self):
-        """Force recalculation of alternative costs for all products"""
-        products = self.search([('alt_currency_id', '!=', False)])
-        total = len(products)
+        """Force recalculation of alternative costs for all products.
+
+        Products are streamed by id ranges and the cache is invalidated between
+        chunks, so memory usage is bounded by the chunk size and not by the
+        size of the catalogue.
+        """
+        domain = [('effective_alt_currency_id', '!=', False)]
+        total = self.search_count(domain)
         
         if total == 0:
             _logger.info("No products with alternative currency to recalculate")
@@ -153,8 +697,20 @@ class ProductProduct(models.Model):
             
         _logger.info("Recalculating alternative costs for %s products", total)
         
-        # Force recomputation by clearing and triggering dependency
-        products._compute_alt_cost()
+        last_id = 0
+        processed = 0
+        updated = 0
+        while True:
+            products = self.search(domain + [('id', '>', last_id)], order='id', limit=RECALCULATION_CHUNK_SIZE)
+            if not products:
+                break
+            # Bulk mode: grouped conversion and a single UPDATE per batch
+            updated += products._recompute_alt_cost_bulk()
+            processed += len(products)
+            last_id = products[-1].id
+            # Flush dependent recomputations and drop the prefetched records
+            self.env.invalidate_all()
+            _logger.info("Recalculated alternative costs of %s/%s products", processed, total)
         
-        _logger.info("Finished recalculating alternative costs")
-        return True
\ No newline at end of file
+        _logger.info("Finished recalculating alternative costs. %s products changed", updated)
+        return True
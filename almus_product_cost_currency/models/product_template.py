@@ -1,6 +1,49 @@
 # -*- coding: utf-8 -*-
 
 from odoo import api, fields, models
+from odoo.tools import split_every
+
+# Plantillas por sentencia al refrescar los agregados de costo alternativo
+AGGREGATE_REFRESH_BATCH_SIZE = 5000
+
+ALT_COST_AGGREGATE_FIELDS = [
+    'alt_cost_value',
+    'alt_cost_min',
+    'alt_cost_max',
+    'alt_cost_avg',
+    'alt_cost_currency_id',
+]
+
+# Agregados por plantilla de los costos de las variantes activas, en la compañía
+# de la plantilla o en la indicada para las plantillas compartidas
+ALT_COST_AGGREGATE_QUERY = """
+SELECT a.id,
+       a.currency_id,
+       CASE WHEN a.currency_id IS NOT NULL AND a.variant_count = 1
+            THEN a.max_cost ELSE 0.0 END AS alt_cost_value,
+       CASE WHEN a.currency_id IS NOT NULL THEN a.min_cost ELSE 0.0 END AS alt_cost_min,
+       CASE WHEN a.currency_id IS NOT NULL THEN a.max_cost ELSE 0.0 END AS alt_cost_max,
+       CASE WHEN a.currency_id IS NOT NULL THEN a.avg_cost ELSE 0.0 END AS alt_cost_avg
+  FROM (
+        SELECT tt.id,
+               COUNT(pp.id) AS variant_count,
+               CASE WHEN COUNT(DISTINCT s.currency_id) = 1
+                         AND COUNT(s.currency_id) = COUNT(pp.id)
+                    THEN MIN(s.currency_id) END AS currency_id,
+               MIN(s.alt_cost) AS min_cost,
+               MAX(s.alt_cost) AS max_cost,
+               AVG(s.alt_cost) AS avg_cost
+          FROM product_template tt
+     LEFT JOIN product_product pp
+            ON pp.product_tmpl_id = tt.id
+           AND pp.active
+     LEFT JOIN almus_product_alt_cost s
+            ON s.product_id = pp.id
+           AND s.company_id = COALESCE(tt.company_id, %(company_id)s)
+         WHERE tt.id = ANY(%(template_ids)s)
+      GROUP BY tt.id
+       ) a
+"""
 
 
 class ProductTemplate(models.Model):
@@ -15,27 +58,130 @@ class ProductTemplate(models.Model):
         readonly=True,
         help='Alternative currency used to display cost (from variant)'
     )
-    
+
+    effective_alt_currency_id = fields.Many2one(
+        'res.currency',
+        string='Effective Alternative Currency',
+        related='product_variant_ids.effective_alt_currency_id',
+        help='Alternative currency of the variant, or the one configured in settings'
+    )
+
     alt_cost = fields.Monetary(
         string='Cost in Alt. Currency',
         related='product_variant_ids.alt_cost',
         readonly=True,
-        currency_field='alt_currency_id',
+        currency_field='effective_alt_currency_id',
         help='Product cost converted to the alternative currency (from variant)'
     )
-    
+
+    # Stored aggregates over the active variants, maintained in SQL from the
+    # per-company store (see _refresh_alt_cost_aggregates) so templates can be
+    # sorted, grouped and filtered by alternative cost in the database. They
+    # are computed for the template company, or the main company for shared
+    # templates, whatever the current company.
+    alt_cost_currency_id = fields.Many2one(
+        'res.currency',
+        string='Alt. Cost Currency',
+        readonly=True,
+        index=True,
+        help='Alternative currency shared by all the variants (empty if they differ)'
+    )
+
+    alt_cost_value = fields.Monetary(
+        string='Alt. Cost',
+        readonly=True,
+        index=True,
+        currency_field='alt_cost_currency_id',
+        help='Alternative cost of the single variant (main company for shared products)'
+    )
+
+    alt_cost_min = fields.Monetary(
+        string='Min. Alt. Cost',
+        readonly=True,
+        index=True,
+        currency_field='alt_cost_currency_id',
+        help='Lowest alternative cost across variants (main company for shared products)'
+    )
+
+    alt_cost_max = fields.Monetary(
+        string='Max. Alt. Cost',
+        readonly=True,
+        index=True,
+        currency_field='alt_cost_currency_id',
+        help='Highest alternative cost across variants (main company for shared products)'
+    )
+
+    alt_cost_avg = fields.Monetary(
+        string='Avg. Alt. Cost',
+        readonly=True,
+        currency_field='alt_cost_currency_id',
+        group_operator='avg',
+        help='Average alternative cost across variants (main company for shared products)'
+    )
+
     # Helper field to know if we should show alt cost fields
     show_alt_cost = fields.Boolean(
         compute='_compute_show_alt_cost',
         help='Technical field to know if alternative cost should be displayed'
     )
-    
-    @api.depends('product_variant_count', 'alt_currency_id')
+
+    @api.depends('product_variant_count', 'effective_alt_currency_id')
     def _compute_show_alt_cost(self):
-        """Determine if alternative cost fields should be shown"""
+        """Single variant products with an alternative currency, their own or the
+        one of settings, whatever the companies with a stored cost"""
         for template in self:
-            # Show only for single variant products with alt currency configured
             template.show_alt_cost = (
-                template.product_variant_count == 1 and 
-                bool(template.alt_currency_id)
-            )
\ No newline at end of file
+                template.product_variant_count == 1 and
+                bool(template.effective_alt_currency_id)
+            )
+
+    def _refresh_alt_cost_aggregates(self):
+        """Recompute the stored alternative cost aggregates of the templates.
+
+        One ``UPDATE ... FROM`` statement per batch aggregates the stored
+        alternative costs of the active variants. Aggregates are only set when
+        all the variants share one alternative currency, and rows whose values
+        did not change are left untouched.
+
+        :return: number of updated templates
+        """
+        template_ids = [template_id for template_id in self.ids if template_id]
+        if not template_ids:
+            return 0
+        self.env['almus.product.alt.cost'].flush_model()
+        self.env['product.product'].flush_model(['active', 'product_tmpl_id'])
+        self.flush_model(['company_id'])
+        main_company = self.env['res.company']._get_main_company()
+        updated = 0
+        for batch in split_every(AGGREGATE_REFRESH_BATCH_SIZE, template_ids):
+            self._cr.execute("""
+                UPDATE product_template AS t
+                   SET alt_cost_currency_id = v.currency_id,
+                       alt_cost_value = v.alt_cost_value,
+                       alt_cost_min = v.alt_cost_min,
+                       alt_cost_max = v.alt_cost_max,
+                       alt_cost_avg = v.alt_cost_avg
+                  FROM (
+                        {aggregates}
+                       ) v
+                 WHERE t.id = v.id
+                   AND (t.alt_cost_currency_id, t.alt_cost_value, t.alt_cost_min,
+                        t.alt_cost_max, t.alt_cost_avg)
+                       IS DISTINCT FROM
+                       (v.currency_id, v.alt_cost_value, v.alt_cost_min,
+                        v.alt_cost_max, v.alt_cost_avg)
+            """.format(aggregates=ALT_COST_AGGREGATE_QUERY), {
+                'company_id': main_company.id,
+                'template_ids': list(batch),
+            })
+            updated += self._cr.rowcount
+        self.invalidate_recordset(ALT_COST_AGGREGATE_FIELDS)
+        return updated
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'company_id' in vals:
+            # The aggregates and the stored variant costs are computed for the template company
+            self.with_context(active_test=False).product_variant_ids._refresh_alt_cost_value()
+            self._refresh_alt_cost_aggregates()
+        return res
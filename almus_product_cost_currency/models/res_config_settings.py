@@ -17,6 +17,13 @@ class ResConfigSettings(models.TransientModel):
         config_parameter='almus_product_cost_currency.alt_currency_id'
     )
     
+    alt_cost_deferred_recompute = fields.Boolean(
+        string='Deferred Alternative Cost Recompute',
+        help='Recompute the alternative costs changed by stock valuation once, '
+             'grouped, at the end of the transaction instead of product by product',
+        config_parameter='almus_product_cost_currency.deferred_recompute'
+    )
+    
     # Technical field to show info about last update
     alt_currency_last_update = fields.Char(
         string='Last Currency Update',
@@ -24,13 +31,37 @@ class ResConfigSettings(models.TransientModel):
         help='Information about the last alternative currency update'
     )
 
+    # Background job applying the last alternative currency change
+    alt_cost_job_id = fields.Many2one(
+        'almus.alt.cost.job',
+        string='Currency Update Job',
+        compute='_compute_alt_cost_job_id',
+        help='Last background job updating the alternative currency of products'
+    )
+    alt_cost_job_state = fields.Selection(
+        related='alt_cost_job_id.state',
+        string='Currency Update State'
+    )
+    alt_cost_job_progress = fields.Float(
+        related='alt_cost_job_id.progress',
+        string='Currency Update Progress'
+    )
+
+    def _compute_alt_cost_job_id(self):
+        job = self.env['almus.alt.cost.job'].sudo().search([('job_type', '=', 'currency_change')], limit=1)
+        for record in self:
+            record.alt_cost_job_id = job
+
     @api.depends('product_alt_currency_id')
     def _compute_alt_currency_last_update(self):
         """Show information about products using alternative currency"""
         for record in self:
             if record.product_alt_currency_id:
+                # Productos con la moneda explícita o heredada de la configuración
                 count = self.env['product.product'].search_count([
-                    ('alt_currency_id', '=', record.product_alt_currency_id.id)
+                    '|',
+                    ('alt_currency_id', '=', record.product_alt_currency_id.id),
+                    ('alt_currency_id', '=', False),
                 ])
                 record.alt_currency_last_update = _(
                     '%(count)s products are using %(currency)s as alternative currency',
@@ -43,13 +74,14 @@ class ResConfigSettings(models.TransientModel):
     def set_values(self):
         """Override to update all products when currency changes"""
         # Get current value before saving
-        old_currency_id = int(self.env['ir.config_parameter'].sudo().get_param(
-            'almus_product_cost_currency.alt_currency_id', 
-            default='0'
-        ))
+        old_currency_id = self.env['product.product']._get_alt_currency_param_id()
         
         super().set_values()
         
+        # Drop the cached alternative currency so that it is read again
+        if old_currency_id != self.product_alt_currency_id.id:
+            self.env.registry.clear_cache()
+        
         # Get new value after saving
         new_currency_id = self.product_alt_currency_id.id
         
@@ -69,7 +101,7 @@ class ResConfigSettings(models.TransientModel):
                     self.product_alt_currency_id.name
                 )
             
-            # Update products in background
+            # Update products in a background job
             self.env['product.product'].sudo()._update_alt_currency_from_settings(new_currency_id)
 
     def action_recalculate_alt_costs(self):
@@ -88,7 +120,7 @@ class ResConfigSettings(models.TransientModel):
         
         # Get products count
         products_count = self.env['product.product'].search_count([
-            ('alt_currency_id', '!=', False)
+            ('effective_alt_currency_id', '!=', False)
         ])
         
         if products_count == 0:
@@ -102,7 +134,6 @@ class ResConfigSettings(models.TransientModel):
                 'view_mode': 'form',
                 'target': 'new',
                 'context': {
-                    'default_products_count': products_count,
                     'default_currency_id': self.product_alt_currency_id.id,
                 }
             }
@@ -114,11 +145,20 @@ class ResConfigSettings(models.TransientModel):
                 'view_mode': 'form',
                 'target': 'new',
                 'context': {
-                    'default_products_count': products_count,
                     'default_currency_id': self.product_alt_currency_id.id,
                 }
             }
 
+    def action_view_alt_cost_jobs(self):
+        """Action to follow the background alternative cost jobs"""
+        self.ensure_one()
+        return {
+            'type': 'ir.actions.act_window',
+            'name': _('Alternative Cost Jobs'),
+            'res_model': 'almus.alt.cost.job',
+            'view_mode': 'tree,form',
+        }
+
     def action_view_products_alt_currency(self):
         """Action to view products using alternative currency"""
         self.ensure_one()
@@ -131,7 +171,11 @@ class ResConfigSettings(models.TransientModel):
             'name': _('Products with Alternative Currency'),
             'res_model': 'product.product',
             'view_mode': 'tree,form',
-            'domain': [('alt_currency_id', '=', self.product_alt_currency_id.id)],
+            'domain': [
+                '|',
+                ('alt_currency_id', '=', self.product_alt_currency_id.id),
+                ('alt_currency_id', '=', False),
+            ],
             'context': {
                 'search_default_filter_active': 1,
             }
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models
+from datetime import timedelta
+
+# Última fecha cuyas tasas se aplicaron a los costos alternativos almacenados
+RATE_REFRESH_DATE_PARAM = 'almus_product_cost_currency.rate_refresh_date'
+
+
+class ResCurrencyRate(models.Model):
+    _inherit = 'res.currency.rate'
+
+    def _get_alt_cost_rate_keys(self):
+        """Return the (company, currency) pairs whose current conversion may change.
+
+        Rates dated in the future do not affect today's conversion, which is the
+        one used by the stored alternative cost; they are applied by
+        ``_cron_refresh_alt_costs_for_effective_rates`` when their date comes.
+        """
+        today = fields.Date.today()
+        return {
+            (rate.company_id.id, rate.currency_id.id)
+            for rate in self
+            if rate.name and rate.name <= today
+        }
+
+    def _refresh_product_alt_costs(self, rate_keys):
+        if rate_keys:
+            self.env['product.product'].sudo()._refresh_alt_cost_for_rates(rate_keys)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        rates = super().create(vals_list)
+        rates._refresh_product_alt_costs(rates._get_alt_cost_rate_keys())
+        return rates
+
+    def write(self, vals):
+        # Collect the pairs before and after the write: company, currency or date may change
+        rate_keys = self._get_alt_cost_rate_keys()
+        res = super().write(vals)
+        self._refresh_product_alt_costs(rate_keys | self._get_alt_cost_rate_keys())
+        return res
+
+    def unlink(self):
+        rate_keys = self._get_alt_cost_rate_keys()
+        res = super().unlink()
+        self._refresh_product_alt_costs(rate_keys)
+        return res
+
+    @api.model
+    def _cron_refresh_alt_costs_for_effective_rates(self):
+        """Queue the refresh of the stored alternative costs for the rates whose date was reached.
+
+        Covers every date since the last run, so a missed day is caught up.
+
+        :return: number of (company, currency) pairs refreshed
+        """
+        today = fields.Date.today()
+        params = self.env['ir.config_parameter'].sudo()
+        last_date = fields.Date.to_date(params.get_param(RATE_REFRESH_DATE_PARAM)) or today - timedelta(days=1)
+        rates = self.sudo().search([('name', '>', last_date), ('name', '<=', today)])
+        rate_keys = rates._get_alt_cost_rate_keys()
+        rates._refresh_product_alt_costs(rate_keys)
+        params.set_param(RATE_REFRESH_DATE_PARAM, fields.Date.to_string(today))
+        return len(rate_keys)
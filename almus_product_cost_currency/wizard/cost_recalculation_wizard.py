@@ -9,8 +9,32 @@ class AlmusCostRecalculationWizard(models.TransientModel):
 
     products_count = fields.Integer(
         string='Products to Update',
-        readonly=True,
-        help='Number of products that will be updated'
+        compute='_compute_products_count',
+        help='Estimated number of products that will be recomputed'
+    )
+
+    # Filtros para recalcular solo un subconjunto del catálogo
+    categ_ids = fields.Many2many(
+        'product.category',
+        string='Product Categories',
+        help='Only recompute products of these categories (and their subcategories)'
+    )
+
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        help='Only recompute the alternative cost of this company'
+    )
+
+    product_ids = fields.Many2many(
+        'product.product',
+        string='Products',
+        help='Only recompute these products'
+    )
+
+    changed_since = fields.Datetime(
+        string='Changed Since',
+        help='Only recompute products modified since this date'
     )
     
     currency_id = fields.Many2one(
@@ -19,24 +43,89 @@ class AlmusCostRecalculationWizard(models.TransientModel):
         readonly=True,
         help='Alternative currency to use for recalculation'
     )
+
+    job_id = fields.Many2one(
+        'almus.alt.cost.job',
+        string='Recalculation Job',
+        readonly=True,
+        help='Background job running the recalculation'
+    )
+
+    job_state = fields.Selection(
+        related='job_id.state',
+        string='State'
+    )
+
+    job_progress = fields.Float(
+        related='job_id.progress',
+        string='Progress'
+    )
+
+    job_processed_count = fields.Integer(
+        related='job_id.processed_count',
+        string='Processed Products'
+    )
+
+    job_updated_count = fields.Integer(
+        related='job_id.updated_count',
+        string='Updated Costs'
+    )
+
+    job_throughput = fields.Float(
+        related='job_id.throughput',
+        string='Throughput (products/s)'
+    )
+
+    job_time_remaining = fields.Float(
+        related='job_id.time_remaining',
+        string='Estimated Time Left'
+    )
     
+    def _get_filter_domain(self):
+        """Domain of the subset to recompute (empty for the whole catalogue)"""
+        self.ensure_one()
+        domain = []
+        if self.categ_ids:
+            domain.append(('categ_id', 'child_of', self.categ_ids.ids))
+        if self.product_ids:
+            domain.append(('id', 'in', self.product_ids.ids))
+        if self.changed_since:
+            domain.append(('write_date', '>=', fields.Datetime.to_string(self.changed_since)))
+        return domain
+
+    @api.depends('categ_ids', 'company_id', 'product_ids', 'changed_since')
+    def _compute_products_count(self):
+        Product = self.env['product.product'].with_context(active_test=False)
+        for wizard in self:
+            domain = [('effective_alt_currency_id', '!=', False)] + wizard._get_filter_domain()
+            if wizard.company_id:
+                domain += ['|', ('company_id', '=', False), ('company_id', '=', wizard.company_id.id)]
+            wizard.products_count = Product.search_count(domain)
+
     def action_confirm_recalculation(self):
-        """Confirm and execute the recalculation"""
+        """Queue the recalculation as a background job and follow its progress"""
         self.ensure_one()
         
-        # Execute recalculation
-        self.env['product.product'].sudo().action_recalculate_alt_costs()
+        domain = self._get_filter_domain()
+        self.job_id = self.env['almus.alt.cost.job'].sudo()._enqueue({
+            'name': _('Recalculate alternative costs of a subset of products')
+                    if domain or self.company_id else _('Recalculate alternative costs'),
+            'job_type': 'recalculate',
+            'currency_id': self.currency_id.id,
+            'company_id': self.company_id.id,
+            'domain': repr(domain),
+        })
         
+        return self.action_refresh()
+
+    def action_refresh(self):
+        """Reopen the wizard to display the current progress of the job"""
+        self.ensure_one()
         return {
-            'type': 'ir.actions.client',
-            'tag': 'display_notification',
-            'params': {
-                'title': _('Success'),
-                'message': _('Alternative costs have been recalculated for %s products.') % self.products_count,
-                'type': 'success',
-                'sticky': False,
-                'next': {
-                    'type': 'ir.actions.act_window_close'
-                }
-            }
-        }
\ No newline at end of file
+            'type': 'ir.actions.act_window',
+            'name': _('Cost Recalculation'),
+            'res_model': self._name,
+            'res_id': self.id,
+            'view_mode': 'form',
+            'target': 'new',
+        }